@@ -0,0 +1,62 @@
+"""
+Helpers shared by benchmarks
+
+Benchmarks are modules run from the `src` folder, e.g.
+`python -m benchmarks.graph_paint`. They don't need a display
+(Qt `offscreen` platform) or network, so they can run in CI.
+"""
+
+import os
+import pathlib
+import sys
+import time
+from typing import Any, Callable, Dict, Tuple
+
+SRC = pathlib.Path(__file__).parent.parent.absolute()
+CIVS = ("English", "French", "Mongols", "Rus", "Delhi Sultanate",
+        "Abbasid Dynasty", "Chinese", "Holy Roman Empire")
+
+
+def qt_app():
+    """ Creates a `QApplication` without a display"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import overlay.helper_func as hf
+    from PyQt5 import QtWidgets
+
+    # Files are looked up next to the started script, which is this one
+    hf.ROOT = SRC
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(
+        sys.argv)
+
+
+def measure(function: Callable[[], None],
+            repeat: int = 1) -> Tuple[float, float]:
+    """ Runs `function` `repeat` times.
+    Returns milliseconds of wall and CPU time per run."""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(repeat):
+        function()
+    return ((time.perf_counter() - wall) / repeat * 1000,
+            (time.process_time() - cpu) / repeat * 1000)
+
+
+def sample_game(offset: int) -> Dict[str, Any]:
+    """ Processed game data (as shown on the overlay) with 8 players"""
+    return {
+        "map": f"Map {offset}",
+        "players": [{
+            'civ': CIVS[(i + offset) % len(CIVS)],
+            'name': f"Player {i + offset}",
+            'team': 1 + i // 4,
+            'country': "us" if (i + offset) % 2 else "de",
+            'rating': str(1000 + i + offset),
+            'rank': f"RM#{100 + i + offset}",
+            'wins': str(50 + i + offset),
+            'losses': str(40 + i),
+            'winrate': f"{55 + i + offset}%",
+            'civ_games': str(10 + i),
+            'civ_winrate': f"{50 + i}.0%",
+            'civ_win_length_median': f"2{i}:00"
+        } for i in range(8)]
+    }
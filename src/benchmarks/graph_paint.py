@@ -0,0 +1,70 @@
+"""
+Rendering of `GraphWidget` with 1k, 10k and 100k points: full render
+(rebuilding the cache), repaint from the cache and a frame while panning
+(cached series moved to the new view)
+
+python -m benchmarks.graph_paint
+"""
+
+import random
+from typing import Dict, Tuple
+
+from benchmarks.common import measure, qt_app
+
+app = qt_app()
+
+from PyQt5 import QtGui
+
+from overlay.graph_widget import GraphWidget
+
+
+def benchmark(sizes: Tuple[int, ...] = (1_000, 10_000, 100_000),
+              repeat: int = 5,
+              width: int = 1280,
+              height: int = 720) -> Dict[int, Tuple[float, float, float]]:
+    """ Returns {size: (full render, cached repaint, pan frame)} in milliseconds"""
+    rng = random.Random(0)
+    result = dict()
+    for size in sizes:
+        widget = GraphWidget()
+        widget.resize(width, height)
+        y = 1000
+        ys = []
+        for _ in range(size):
+            y += rng.randint(-16, 16)
+            ys.append(y)
+        widget.plot(range(size), ys, label=f"{size} points")
+
+        first, _ = measure(lambda: widget.render_image(width, height), repeat)
+
+        image = QtGui.QImage(width, height,
+                             QtGui.QImage.Format_ARGB32_Premultiplied)
+        cache = widget._build_cache(width, height, 1)
+
+        def repaint():
+            qp = QtGui.QPainter(image)
+            widget._paint(qp, cache)
+            qp.end()
+
+        cached, _ = measure(repaint, repeat)
+
+        # Zoomed in to a tenth and dragged by a tenth of the view
+        widget.view = (size * 0.45, size * 0.55)
+        cache = widget._build_cache(width, height, 1)
+        widget.view = (size * 0.46, size * 0.56)
+        interim = widget._interim_transform(cache)
+
+        def pan():
+            qp = QtGui.QPainter(image)
+            widget._paint(qp, cache, interim)
+            qp.end()
+
+        panning, _ = measure(pan, repeat)
+        result[size] = (first, cached, panning)
+    return result
+
+
+if __name__ == "__main__":
+    for size, (first, cached, panning) in benchmark().items():
+        print(f"{size:>7} points | render {first:7.1f} ms | "
+              f"cached repaint {cached:6.1f} ms | pan frame {panning:6.1f} ms")
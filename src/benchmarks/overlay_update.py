@@ -0,0 +1,43 @@
+"""
+`AoEOverlay.update_data` with unchanged data, one changed field
+and all players swapped
+
+python -m benchmarks.overlay_update
+"""
+
+from typing import Dict
+
+from benchmarks.common import measure, qt_app, sample_game
+
+app = qt_app()
+
+from overlay.overlay_widget import AoEOverlay
+
+def benchmark(repeat: int = 200) -> Dict[str, float]:
+    """ Returns milliseconds per update"""
+    overlay = AoEOverlay()
+    overlay.show()
+    first, second = sample_game(0), sample_game(1)
+    changed = sample_game(0)
+    changed['players'][0] = dict(changed['players'][0], rating="1234")
+    result = dict()
+
+    for name, data in (("unchanged", (first, )), ("one field",
+                                                  (first, changed)),
+                       ("full swap", (first, second))):
+        overlay.update_data(data[-1])
+        app.processEvents()
+        updates = iter(range(repeat))
+
+        def update():
+            overlay.update_data(data[next(updates) % len(data)])
+            app.processEvents()
+
+        result[name], _ = measure(update, repeat)
+    overlay.close()
+    return result
+
+
+if __name__ == "__main__":
+    for name, ms in benchmark().items():
+        print(f"{name:>10} | {ms:6.3f} ms per update")
@@ -0,0 +1,84 @@
+"""
+Stats of up to 100k synthetic games
+
+Adding games to `StatsCube` and rolling windows costs the same for each game
+and filtering doesn't depend on the number of games.
+
+python -m benchmarks.stats_cube
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+from benchmarks.common import measure
+from overlay.aoe4_data import civ_data
+from overlay.match_stats import (MODES, GameRecord, StatsCube, WinStreaks,
+                                 rolling_windows)
+
+MAPS = tuple(f"Map {i}" for i in range(30))
+START = 1_650_000_000
+
+
+def records(count: int, seed: int = 0) -> List[GameRecord]:
+    """ Returns synthetic games, one every 10 minutes"""
+    rng = random.Random(seed)
+    civs = tuple(civ_data)
+    return [
+        GameRecord(game_id, START + game_id * 600, rng.choice(civs),
+                   rng.choice(MAPS), rng.choice(MODES),
+                   rng.random() < 0.5, 1000 + rng.randrange(-200, 200),
+                   (rng.choice(civs), ), 1000)
+        for game_id in range(count)
+    ]
+
+
+def filters(cube: StatsCube):
+    """ All filters the stats tab can show"""
+    for mode in (None, *MODES):
+        cube.total(mode)
+        cube.civ_stats(mode)
+        for civ in (None, *civ_data):
+            cube.map_stats(mode, civ)
+
+
+def benchmark(sizes: Tuple[int, ...] = (1_000, 10_000, 100_000),
+              repeat: int = 5) -> Dict[int, Dict[str, float]]:
+    """ Returns milliseconds of wall time for each number of games:
+    adding all games, every filter combination and counting streaks"""
+    results = dict()
+    for size in sizes:
+        games = records(size)
+        cube = StatsCube()
+        windows = rolling_windows()
+        streaks = WinStreaks()
+
+        def add():
+            cube.clear()
+            for window in windows.values():
+                window.clear()
+            streaks.clear()
+            for record in games:
+                cube.add(record)
+                for window in windows.values():
+                    window.add(record)
+                streaks.add(record)
+
+        def count_streaks():
+            streaks.changed = set(MODES)
+            for mode in MODES:
+                streaks.longest(mode)
+
+        results[size] = {
+            "add": measure(add, 1)[0],
+            "filters": measure(lambda: filters(cube), repeat)[0],
+            "streaks": measure(count_streaks, repeat)[0]
+        }
+    return results
+
+
+if __name__ == '__main__':
+    for size, result in benchmark().items():
+        print(f"{size:>7} games | add {result['add']:8.1f} ms "
+              f"({result['add'] / size * 1000:.1f} µs per game) | "
+              f"all filters {result['filters']:6.2f} ms | "
+              f"streaks {result['streaks']:6.2f} ms")
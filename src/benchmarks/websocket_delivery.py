@@ -0,0 +1,98 @@
+"""
+Websocket delivery latency and CPU use with 1, 10 and 100 local clients
+
+Latency is measured from `Websocket_manager.send` until a client receives
+the message. CPU is the time used by the process (server and clients)
+per delivered message and while idle.
+
+python -m benchmarks.websocket_delivery
+"""
+
+import asyncio
+import logging
+import socket
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import websockets
+
+from benchmarks.common import sample_game
+from overlay.websocket import Websocket_manager
+
+# Connection logs would be counted as CPU use
+logging.getLogger("overlay.websocket").setLevel(logging.WARNING)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_manager() -> Websocket_manager:
+    manager = Websocket_manager(free_port())
+    manager.run()
+    while manager.loop is None or not manager.loop.is_running():
+        time.sleep(0.01)
+    return manager
+
+
+async def receive(connection, sent: float, latencies: List[float]):
+    await connection.recv()
+    latencies.append(time.perf_counter() - sent)
+
+
+async def measure_clients(clients: int, messages: int,
+                          idle: float) -> Dict[str, float]:
+    manager = start_manager()
+    # The initial state is sent on connect
+    manager.send({"type": "color", "data": {"name": "white"}})
+    connections = []
+    for _ in range(clients):
+        connection = await websockets.connect(f"ws://localhost:{manager.port}")
+        await connection.recv()
+        connections.append(connection)
+
+    cpu = time.process_time()
+    await asyncio.sleep(idle)
+    idle_cpu = time.process_time() - cpu
+
+    latencies: List[float] = []
+    cpu = time.process_time()
+    for i in range(messages):
+        message = {"type": "player_data", "data": sample_game(i % 2)}
+        sent = time.perf_counter()
+        manager.send(message)
+        await asyncio.gather(*(receive(connection, sent, latencies)
+                               for connection in connections))
+    send_cpu = time.process_time() - cpu
+
+    for connection in connections:
+        await connection.close()
+    latencies.sort()
+    return {
+        "median": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "cpu": send_cpu / (messages * clients) * 1000,
+        "idle": idle_cpu / idle * 100
+    }
+
+
+def benchmark(clients: Tuple[int, ...] = (1, 10, 100),
+              messages: int = 100,
+              idle: float = 1) -> Dict[int, Dict[str, float]]:
+    """ Returns latency (median and 99th percentile, ms), CPU time per
+    delivered message (ms) and CPU use while idle (%) for each client count"""
+    return {
+        count: asyncio.run(measure_clients(count, messages, idle))
+        for count in clients
+    }
+
+
+if __name__ == '__main__':
+    for count, result in benchmark().items():
+        print(f"{count:>4} clients | latency {result['median']:7.2f} ms "
+              f"(p99 {result['p99']:7.2f} ms) | "
+              f"{result['cpu']:.3f} ms CPU per delivery | "
+              f"{result['idle']:.1f}% CPU idle")
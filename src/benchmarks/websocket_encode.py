@@ -0,0 +1,64 @@
+"""
+Cost of encoding websocket messages for 1 to 1000 clients
+
+`Websocket_manager.send` encodes a message once (player data twice: the patch
+and the full snapshot) and shares the strings with all clients, so the encoding
+cost per message doesn't depend on the number of clients. Only queueing
+the message (a deque append per client) does.
+
+python -m benchmarks.websocket_encode
+"""
+
+import time
+from typing import Dict, Tuple
+
+import overlay.websocket as websocket
+from benchmarks.common import sample_game
+from overlay.websocket import Client, Websocket_manager
+
+
+class EncodeCounter:
+    """ Wraps `encode_message` to count calls and their time"""
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.
+        self.encode = websocket.encode_message
+
+    def __call__(self, message):
+        start = time.perf_counter()
+        result = self.encode(message)
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+        return result
+
+
+def benchmark(clients: Tuple[int, ...] = (1, 10, 100, 1000),
+              repeat: int = 500) -> Dict[int, Tuple[float, float, float]]:
+    """ Returns encodes per message, encoding and total `send` time
+    per message (ms) for each number of clients"""
+    results = dict()
+    games = sample_game(0), sample_game(1)
+    for count in clients:
+        # Without a running loop messages are queued directly in `send`
+        manager = Websocket_manager(0)
+        manager.clients = {Client(manager.queue_size) for _ in range(count)}
+        counter = EncodeCounter()
+        websocket.encode_message = counter
+        try:
+            start = time.perf_counter()
+            for i in range(repeat):
+                manager.send({"type": "player_data", "data": games[i % 2]})
+            total = time.perf_counter() - start
+        finally:
+            websocket.encode_message = counter.encode
+        results[count] = (counter.calls / repeat,
+                          counter.seconds / repeat * 1000,
+                          total / repeat * 1000)
+    return results
+
+
+if __name__ == '__main__':
+    print(f"orjson: {websocket.orjson is not None}")
+    for count, (calls, encode, send) in benchmark().items():
+        print(f"{count:>5} clients | {calls:.0f} encodes per message | "
+              f"encode {encode:.3f} ms | send {send:.3f} ms")
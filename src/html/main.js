@@ -9,14 +9,16 @@ function connect_to_socket() {
 
     console.log("Trying to connect...");
     function_is_running = true;
-    let socket = new WebSocket(`ws://localhost:${PORT}`);
+    // Use the same host when the overlay is served by the app
+    let host = location.protocol.startsWith("http") ? location.host : `localhost:${PORT}`;
+    let socket = new WebSocket(`ws://${host}`);
     socket.onopen = function (e) {
         console.log("CONNECTED");
     };
     socket.onmessage = function (event) {
         let data = JSON.parse(event.data);
         console.log(`New event: ${event.data}`);
-        parse_message(data);
+        parse_message(data, socket);
     };
 
     socket.onclose = function (event) {
@@ -42,16 +44,71 @@ function reconnect_to_socket() {
 // Overlay functionality
 var team_colors = [[74, 255, 2, 0.35], [3, 179, 255, 0.35], [255, 0, 0, 0.35]];
 var custom_func = null;
+var player_data = null;
+var player_data_version = null;
+var rendered = { map: null, recent: null, team1: null, team2: null };
 
-function parse_message(data) {
+function parse_message(data, socket) {
     if (data.type == "color")
         team_colors = data.data;
-    else if (data.type == "player_data")
-        update_player_data(data.data)
+    else if (data.type == "player_data") {
+        player_data = data.data;
+        player_data_version = data.version;
+        update_player_data(player_data);
+    }
+    else if (data.type == "player_data_patch") {
+        // Ask for the full data if we don't have the version the patch is for
+        if (player_data == null || data.base != player_data_version) {
+            console.log(`Resync (have ${player_data_version}, patch for ${data.base})`);
+            socket.send(JSON.stringify({ type: "resync" }));
+            return;
+        }
+        player_data = apply_patch(player_data, data.patch);
+        player_data_version = data.version;
+        update_player_data(player_data);
+    }
+}
+
+// Applies JSON patch operations (add, remove, replace) to `doc` and returns it
+function apply_patch(doc, patch) {
+    for (const op of patch) {
+        if (op.path == "") {
+            doc = op.value;
+            continue;
+        }
+        let keys = op.path.split("/").slice(1).map(k => k.replace(/~1/g, "/").replace(/~0/g, "~"));
+        let last = keys.pop();
+        let parent = doc;
+        for (const key of keys) parent = parent[key];
+        if (Array.isArray(parent)) {
+            let index = last == "-" ? parent.length : parseInt(last);
+            if (op.op == "add") parent.splice(index, 0, op.value);
+            else if (op.op == "remove") parent.splice(index, 1);
+            else parent[index] = op.value;
+        } else {
+            if (op.op == "remove") delete parent[last];
+            else parent[last] = op.value;
+        }
+    }
+    return doc;
+}
+
+// Replaces element content only when it changed
+function set_html(id, html) {
+    if (rendered[id] === html) return;
+    rendered[id] = html;
+    $(`#${id}`).html(html);
 }
 
 function update_player_data(data) {
-    $("#map").text(data.map);
+    if (rendered.map !== data.map) {
+        rendered.map = data.map;
+        $("#map").text(data.map);
+    }
+    if (rendered.recent !== (data.recent || "")) {
+        rendered.recent = data.recent || "";
+        $("#recent").text(rendered.recent);
+    }
     let team_data = { 1: "", 2: "" };
     let first_team = null;
     let second_team = null;
@@ -74,8 +131,8 @@ function update_player_data(data) {
             team_data[p.team] += s;
     }
     if (first_team == 1) second_team = 2; else second_team = 1;
-    $("#team1").html(team_data[first_team]);
-    $("#team2").html(team_data[second_team]);
+    set_html("team1", team_data[first_team]);
+    set_html("team2", team_data[second_team]);
     if (custom_func != null) custom_func(data)
 }
 
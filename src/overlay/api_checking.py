@@ -1,15 +1,45 @@
+import hashlib
 import json
+import threading
 import time
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 
 from overlay.logging_func import get_logger
+from overlay.match_store import match_store
 from overlay.settings import settings
 
 logger = get_logger(__name__)
 session = requests.session()
+# Response validators for conditional requests {url: (etag, last_modified, body hash)}
+validators: Dict[str, Tuple[Optional[str], Optional[str], bytes]] = dict()
+
+
+def conditional_get(url: str) -> Optional[requests.Response]:
+    """ Gets `url` with validators from the previous response.
+    Returns `None` when the resource hasn't changed (304 or the same body)."""
+    headers = {}
+    etag, last_modified, body_hash = validators.get(url, (None, None, b""))
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    resp = session.get(url, headers=headers)
+    if resp.status_code == 304:
+        return None
+    if resp.status_code != 200:
+        return resp
+
+    new_hash = hashlib.blake2b(resp.content, digest_size=16).digest()
+    validators[url] = (resp.headers.get('ETag'),
+                       resp.headers.get('Last-Modified'), new_hash)
+    if new_hash == body_hash:
+        return None
+    return resp
 
 
 def find_player(text: str) -> bool:
@@ -94,10 +124,10 @@ def get_leaderboard_data(leaderboard_id: int) -> Dict[str, Any]:
         return {}
 
 
-def get_full_match_history(amount: int) -> Optional[List[Any]]:
-    """ Gets match history and adds some data its missing"""
-
-    url = f"https://aoe4world.com/api/v0/players/{settings.profile_id}/games?limit={amount}"
+def get_match_history_page(profile_id: int, page: int,
+                           limit: int) -> Optional[List[Any]]:
+    """ Gets one page of match history (newest games first)"""
+    url = f"https://aoe4world.com/api/v0/players/{profile_id}/games?page={page}&limit={limit}"
     try:
         resp = session.get(url).text
         data = json.loads(resp)
@@ -107,39 +137,269 @@ def get_full_match_history(amount: int) -> Optional[List[Any]]:
         return None
 
 
+class MatchHistorySync:
+    """ Downloads match history page by page, newest games first,
+    and saves it to the local match store
+
+    A sync stops at the newest finished game found by the previous completed sync.
+    If a page fails to download, the next sync resumes from that page.
+    `reset` cancels a running sync, it stops before the next page."""
+    PAGE_SIZE = 50
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Guards the state, not held during requests
+        self.running = threading.Lock()  # One sync at a time
+        self.generation: int = 0  # Increased by `reset`
+        self.loaded: bool = False  # Whether `newest_game_id` was loaded from the store
+        self.newest_game_id: Optional[int] = None
+        # Where an interrupted sync stopped (page, games fetched, newest game id)
+        self.cursor: Optional[Tuple[int, int, Optional[int]]] = None
+
+    def reset(self):
+        """ Forgets sync progress (e.g. a new profile) and cancels a running sync"""
+        with self.lock:
+            self.generation += 1
+            self.loaded = False
+            self.newest_game_id = None
+            self.cursor = None
+
+    def sync(self,
+             max_games: int,
+             generation: Optional[int] = None,
+             progress_callback=None) -> Optional[int]:
+        """ Downloads new games and emits each page through `progress_callback`
+
+        `generation` is the value of `self.generation` when the sync was requested.
+        Once `reset` changes it, the sync stops and drops downloaded pages.
+        Returns the number of new games or `None` if a request failed
+        or the sync was cancelled"""
+        with self.running:
+            with self.lock:
+                if generation is None:
+                    generation = self.generation
+                elif generation != self.generation:
+                    return None
+                profile_id = settings.profile_id
+                if not self.loaded:
+                    self.newest_game_id = match_store.synced_game_id(profile_id)
+                    self.loaded = True
+                newest_known = self.newest_game_id
+                page, fetched, newest = self.cursor or (1, 0, None)
+
+            while fetched < max_games:
+                games = get_match_history_page(profile_id, page, self.PAGE_SIZE)
+                with self.lock:
+                    if generation != self.generation:
+                        logger.info("Match history sync cancelled")
+                        return None
+                    if games is None:
+                        self.cursor = (page, fetched, newest)
+                        return None
+
+                new_games = []
+                done = len(games) < self.PAGE_SIZE
+                for game in games:
+                    if game['ongoing']:
+                        continue
+                    if newest_known is not None and game[
+                            'game_id'] <= newest_known:
+                        done = True
+                        break
+                    if newest is None:
+                        newest = game['game_id']
+                    new_games.append(game)
+
+                fetched += len(new_games)
+                if new_games:
+                    match_store.add_games(profile_id, new_games)
+                    if progress_callback is not None:
+                        progress_callback.emit(new_games)
+                if done:
+                    break
+                page += 1
+
+            with self.lock:
+                if generation != self.generation:
+                    return None
+                self.cursor = None
+                if newest is not None:
+                    self.newest_game_id = newest
+                    match_store.set_synced_game_id(profile_id, newest)
+            return fetched
+
+
+def parse_retry_after(value: Optional[str],
+                      now: Optional[float] = None) -> Optional[float]:
+    """ Parses `Retry-After` header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        ...
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(retry_at - now, 0)
+
+
+class PollScheduler:
+    """ Decides how long to wait before the next check for a new game
+
+    * Shortly after a game ended a new one is likely, poll every `settings.interval`.
+    * While a game is ongoing or the player is idle, back off exponentially.
+    * After errors back off as well, and respect `Retry-After` when rate-limited.
+    """
+    QUEUE_WINDOW = 15 * 60  # After a game ends, expect a new one for this long
+    MAX_ONGOING_INTERVAL = 60
+    MAX_IDLE_INTERVAL = 180
+    MAX_ERROR_INTERVAL = 300
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.ongoing: bool = False
+        self.finished_at: Optional[float] = None  # When the last game ended
+        self.retry_at: float = 0  # Don't poll before this time
+        self.errors: int = 0  # Failed requests in a row
+        self.mode: str = "queue"
+        self.backoff: float = settings.interval
+
+    def reset(self):
+        """ Forgets the previous state (e.g. a new profile)"""
+        self.ongoing = False
+        self.finished_at = None
+        self.retry_at = 0
+        self.errors = 0
+        self.mode = "queue"
+        self.backoff = settings.interval
+
+    def update(self, data: Dict[str, Any]) -> bool:
+        """ Updates state from the last game data
+        Returns `True` if an ongoing game has just finished"""
+        self.errors = 0
+        if data.get('ongoing'):
+            self.ongoing = True
+            return False
+
+        finished = self.ongoing
+        if self.ongoing or self.finished_at is None:
+            # The game just finished or this is the first game we see
+            self.finished_at = self.clock()
+            duration = data.get('duration')
+            if not self.ongoing and duration and data.get('started_at'):
+                started = datetime.strptime(
+                    data['started_at'], "%Y-%m-%dT%H:%M:%S.000Z").replace(
+                        tzinfo=timezone.utc).timestamp()
+                self.finished_at = min(started + duration, self.finished_at)
+        self.ongoing = False
+        return finished
+
+    def failed(self):
+        """ Request failed"""
+        self.errors += 1
+
+    def unchanged(self):
+        """ Request succeeded but the data are the same as before"""
+        self.errors = 0
+
+    def rate_limited(self, retry_after: Optional[float]):
+        """ Server asked us to slow down"""
+        self.errors += 1
+        if retry_after is not None:
+            self.retry_at = self.clock() + retry_after
+
+    def _get_mode(self, now: float) -> str:
+        if self.errors:
+            return "error"
+        if self.ongoing:
+            return "ongoing"
+        if self.finished_at is None or now - self.finished_at < self.QUEUE_WINDOW:
+            return "queue"
+        return "idle"
+
+    def _backoff(self, mode: str) -> float:
+        """ Returns backoff for the next check in `mode`"""
+        if mode != self.mode or mode == "queue":
+            return settings.interval
+        limit = {
+            "ongoing": self.MAX_ONGOING_INTERVAL,
+            "idle": self.MAX_IDLE_INTERVAL,
+            "error": self.MAX_ERROR_INTERVAL
+        }[mode]
+        return min(self.backoff * 2, max(limit, settings.interval))
+
+    def _delay(self, backoff: float, now: float) -> int:
+        delay = max(backoff, self.retry_at - now)
+        return max(int(round(delay)), 1)
+
+    def next_delay(self) -> int:
+        """ Returns number of seconds to wait before the next check
+        and advances the backoff"""
+        now = self.clock()
+        mode = self._get_mode(now)
+        self.backoff = self._backoff(mode)
+        self.mode = mode
+        return self._delay(self.backoff, now)
+
+    def peek_delay(self) -> int:
+        """ Returns number of seconds to wait before the next check
+        without advancing the backoff"""
+        now = self.clock()
+        mode = self._get_mode(now)
+        backoff = self.backoff if mode == self.mode else settings.interval
+        return self._delay(backoff, now)
+
+
 class Api_checker:
 
     def __init__(self):
         self.force_stop = False  # To stop the thread
         self.force_check = False  # This can force a check of new data
+        # Notified when `force_stop` or `force_check` changes
+        self.condition = threading.Condition()
         self.last_match_timestamp = datetime(1900, 1, 1, 0, 0, 0)
         self.last_rating_timestamp = datetime(1900, 1, 1, 0, 0, 0)
+        self.scheduler = PollScheduler()
 
     def reset(self):
         """ Resets last timestamps"""
         self.last_match_timestamp = datetime(1900, 1, 1, 0, 0, 0)
         self.last_rating_timestamp = datetime(1900, 1, 1, 0, 0, 0)
-        self.force_check = True
-
-    def sleep(self, seconds: int) -> bool:
-        """ Sleeps while checking for force_stop
+        self.scheduler.reset()
+        validators.clear()
+        self.check_now()
+
+    def stop(self):
+        """ Stops checking, wakes up the sleeping thread"""
+        with self.condition:
+            self.force_stop = True
+            self.condition.notify_all()
+
+    def check_now(self):
+        """ Wakes up the sleeping thread to check for new data"""
+        with self.condition:
+            self.force_check = True
+            self.condition.notify_all()
+
+    def sleep(self, seconds: float) -> bool:
+        """ Sleeps until timeout, `stop` or `check_now`
         Returns `True` if we need to stop the parent function"""
-        for _ in range(seconds * 2):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.force_stop or self.force_check, timeout=seconds)
             if self.force_stop:
                 return True
-
-            if self.force_check:
-                self.force_check = False
-                return False
-
-            time.sleep(0.5)
-        return False
+            self.force_check = False
+            return False
 
     def check_for_new_game(self,
                            delayed_seconds: int = 0
                            ) -> Optional[Dict[str, Any]]:
         """ Continously check if there are a new game being played
-        Returns match data if there is a new game"""
+        Returns match data if there is a new game
+        or `{"game_finished": game_id}` when the ongoing game ends"""
 
         if self.sleep(delayed_seconds):
             return
@@ -149,7 +409,7 @@ class Api_checker:
             if result is not None:
                 return result
 
-            if self.sleep(settings.interval):
+            if self.sleep(self.scheduler.next_delay()):
                 return
 
     def get_data(self) -> Optional[Dict[str, Any]]:
@@ -159,15 +419,27 @@ class Api_checker:
         # Get last match from aoe4world.com
         try:
             url = f"https://aoe4world.com/api/v0/players/{settings.profile_id}/games/last"
-            resp = session.get(url)
+            resp = conditional_get(url)
+            if resp is None:
+                self.scheduler.unchanged()
+                return
+            if resp.status_code in (429, 503):
+                retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                logger.warning(
+                    f"Rate limited ({resp.status_code}), retry after: {retry_after}")
+                self.scheduler.rate_limited(retry_after)
+                return
             data = json.loads(resp.text)
         except Exception:
             logger.exception("")
+            self.scheduler.failed()
             return
 
         if self.force_stop:
             return
         if "error" in data:
+            validators.pop(url, None)
+            self.scheduler.failed()
             return
 
         # Calc old leaderboard id
@@ -181,8 +453,12 @@ class Api_checker:
         started = datetime.strptime(data['started_at'],
                                     "%Y-%m-%dT%H:%M:%S.000Z")
         data['started_sec'] = started.timestamp()
+        finished = self.scheduler.update(data)
 
         # Show the last game
         if started > self.last_match_timestamp:  # and data['ongoing']:
             self.last_match_timestamp = started
             return data
+
+        if finished:
+            return {"game_finished": data['game_id']}
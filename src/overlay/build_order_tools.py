@@ -3,9 +3,11 @@ import os
 from typing import Optional
 
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QPixmap
+from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import QLabel
 
+from overlay.pixmap_cache import pixmap_cache
+
 # flags of the different civilizations
 civilization_flags = {
     'Abbasid Dynasty': 'civilization_flag/CivIcon-AbbasidAoE4_spacing.webp',
@@ -268,35 +270,99 @@ class QLabelSettings:
         if (text_alignment != 'left') and (text_alignment != 'center') and (text_alignment != 'right'):
             self.text_alignment = None
 
+    def style_key(self) -> tuple:
+        """Get a hashable key of the settings defining the style sheet
+
+        Returns
+        -------
+        (text color, boldness, background color)
+        """
+        return (None if (self.text_color is None) else tuple(self.text_color), self.text_bold,
+                None if (self.background_color is None) else tuple(self.background_color))
+
+
+class ImageManifest:
+    """Index of the images in a folder (and its sub-folders), built once to avoid file system lookups"""
+
+    extensions = ['.png', '.jpg', '.webp']  # extensions tried for images without extension (in this order)
+
+    def __init__(self, folder: str):
+        """Constructor
+
+        Parameters
+        ----------
+        folder    folder with the images
+        """
+        self.folder = folder
+        self.files = dict()  # normalized relative path -> path
+        self.names = dict()  # normalized relative path without extension -> path
+
+        for root, _, files in os.walk(folder):
+            for f in files:
+                path = os.path.join(root, f)
+                self.files[self.normalize(os.path.relpath(path, folder))] = path
+
+        for ext in reversed(self.extensions):  # preferred extensions overwrite the other ones
+            for key, path in self.files.items():
+                base, file_ext = os.path.splitext(key)
+                if file_ext == ext:
+                    self.names[base] = path
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """Normalize an image name, so it can be used as a key
+
+        Parameters
+        ----------
+        name    image name (relative path, with or without extension)
+
+        Returns
+        -------
+        normalized name
+        """
+        return os.path.normcase(os.path.normpath(name))
+
+    def search(self, name: str) -> Optional[str]:
+        """Search an image, trying the other extensions if not found with the given one
+
+        Parameters
+        ----------
+        name    image name relative to the folder (with or without extension)
+
+        Returns
+        -------
+        image path, None if not found
+        """
+        key = self.normalize(name)
+        if key in self.files:  # Return the original image if it exists.
+            return self.files[key]
+        return self.names.get(os.path.splitext(key)[0])
+
+
+IMAGE_MANIFESTS = dict()  # image manifest for each folder
+
 
-def search_image_extension(init_image_path: str) -> Optional[str]:
-    """Search the correct extension for a given image.
+def get_image_manifest(folder: str) -> ImageManifest:
+    """Get the manifest of a folder with images, created when first requested
 
     Parameters
     ----------
-    init_image_path    Initial path for the image (with or without extension).
+    folder    folder with the images
 
     Returns
     -------
-    Updated image path, None if not found.
+    manifest of the folder
     """
-    if os.path.isfile(init_image_path):  # Return the original image if it exists.
-        return init_image_path
-    else:
-        # Split into base and (possibly empty) original extension
-        base, orig_ext = os.path.splitext(init_image_path)
+    if folder not in IMAGE_MANIFESTS:
+        IMAGE_MANIFESTS[folder] = ImageManifest(folder)
+    return IMAGE_MANIFESTS[folder]
 
-        extensions = ['.png', '.jpg', '.webp']  # List of extensions to try
-        if orig_ext in extensions:  # Do not re-test the initial extension
-            extensions.remove(orig_ext)
 
-        # Loop until we find the correct extension
-        for ext in extensions:
-            candidate = base + ext
-            if os.path.isfile(candidate):
-                return candidate
+DEFAULT_QLABEL_SETTINGS = QLabelSettings()
 
-    return None  # Image not found
+DEFAULT_ALIGNMENT = Qt.AlignLeft | Qt.AlignVCenter  # default alignment of a QLabel
+
+TEXT_ALIGNMENTS = {'left': Qt.AlignLeft, 'center': Qt.AlignCenter, 'right': Qt.AlignRight}
 
 
 class MultiQLabelDisplay:
@@ -338,6 +404,12 @@ class MultiQLabelDisplay:
         self.common_pictures_folder = common_pictures_folder if (
                 (common_pictures_folder is not None) and os.path.isdir(common_pictures_folder)) else None
 
+        # images of the folders, indexed once
+        self.game_pictures = get_image_manifest(
+            self.game_pictures_folder) if (self.game_pictures_folder is not None) else None
+        self.common_pictures = get_image_manifest(
+            self.common_pictures_folder) if (self.common_pictures_folder is not None) else None
+
         if (self.game_pictures_folder is not None) or (self.common_pictures_folder is not None):
             assert self.image_height > 0  # valid height must be provided
 
@@ -347,6 +419,10 @@ class MultiQLabelDisplay:
         self.row_max_width = 0  # maximal width of a row
         self.row_total_height = 0  # cumulative height of all the rows (with vertical spacing)
 
+        self.font = QFont(self.font_police, self.font_size)  # font of all the labels
+        self.label_pool = []  # hidden labels ready to be reused
+        self.style_sheets = dict()  # style sheet for each 'QLabelSettings.style_key'
+
     def update_settings(self, font_police: str, font_size: int, border_size: int,
                         vertical_spacing: int, color_default: list, image_height: int = -1):
         """Update the settings
@@ -384,6 +460,11 @@ class MultiQLabelDisplay:
         self.row_max_width = 0  # maximal width of a row
         self.row_total_height = 0  # cumulative height of all the rows (with vertical spacing)
 
+        self.font = QFont(self.font_police, self.font_size)
+        for label in self.label_pool:
+            label.setFont(self.font)
+        self.style_sheets.clear()  # default color may have changed
+
     def x(self):
         """Get X position of the first element
 
@@ -423,24 +504,52 @@ class MultiQLabelDisplay:
         self.shown = False
 
     def clear(self):
-        """Hide and remove all labels"""
+        """Hide and remove all labels (they are kept in a pool to be reused)"""
         for row in self.labels:
             for label in row:
-                label.deleteLater()
+                label.hide()
+                self.label_pool.append(label)
             row.clear()
         self.labels.clear()
         self.hide()
 
-    def set_qlabel_settings(self, label: QLabel, settings: QLabelSettings = None):
-        """Adapt the settings (color, boldness...) of a QLabel
+    def get_label(self, parent) -> QLabel:
+        """Get a hidden label, reused from the pool if possible
 
         Parameters
         ----------
-        label       QLabel to update
-        settings    settings of the QLabel, None for default
+        parent    parent element of the label
+
+        Returns
+        -------
+        label to use (its content must be set)
         """
-        if settings is None:  # use default settings
-            settings = QLabelSettings()
+        if len(self.label_pool) == 0:
+            label = QLabel('', parent)
+            label.setFont(self.font)
+            return label
+
+        label = self.label_pool.pop()
+        if label.parent() is not parent:
+            label.setParent(parent)
+        if label.alignment() != DEFAULT_ALIGNMENT:  # alignment possibly set by previous settings
+            label.setAlignment(DEFAULT_ALIGNMENT)
+        return label
+
+    def get_style_sheet(self, settings: QLabelSettings) -> str:
+        """Get the style sheet for QLabel settings (cached)
+
+        Parameters
+        ----------
+        settings    settings of the QLabel
+
+        Returns
+        -------
+        style sheet string
+        """
+        key = settings.style_key()
+        if key in self.style_sheets:
+            return self.style_sheets[key]
 
         # font text color
         text_color = self.color_default if (settings.text_color is None) else settings.text_color
@@ -454,17 +563,31 @@ class MultiQLabelDisplay:
         if settings.text_bold:  # bold font
             style_str += ';font-weight: bold'
 
-        label.setStyleSheet(style_str)
+        self.style_sheets[key] = style_str
+        return style_str
+
+    def set_qlabel_settings(self, label: QLabel, settings: QLabelSettings = None):
+        """Adapt the settings (color, boldness...) of a QLabel
+
+        Parameters
+        ----------
+        label       QLabel to update
+        settings    settings of the QLabel, None for default
+        """
+        if settings is None:  # use default settings
+            settings = DEFAULT_QLABEL_SETTINGS
+
+        # style sheets are expensive to apply, so only set when changed
+        style_str = self.get_style_sheet(settings)
+        if label.styleSheet() != style_str:
+            label.setStyleSheet(style_str)
 
         # text alignment
         text_alignment = settings.text_alignment
         if text_alignment is not None:
-            if text_alignment == 'left':
-                label.setAlignment(Qt.AlignLeft)
-            elif text_alignment == 'center':
-                label.setAlignment(Qt.AlignCenter)
-            elif text_alignment == 'right':
-                label.setAlignment(Qt.AlignRight)
+            alignment = TEXT_ALIGNMENTS[text_alignment]
+            if label.alignment() != alignment:
+                label.setAlignment(alignment)
 
     def add_row_from_picture_line(self, parent, line: str, labels_settings: list = None,
                                   use_pictures: bool = True):
@@ -483,8 +606,7 @@ class MultiQLabelDisplay:
 
         # no picture
         if (not use_pictures) or ((self.game_pictures_folder is None) and (self.common_pictures_folder is None)):
-            label = QLabel('', parent)
-            label.setFont(QFont(self.font_police, self.font_size))
+            label = self.get_label(parent)
             label.setText(line)
             if labels_settings is not None:
                 if len(labels_settings) == 1:
@@ -508,18 +630,16 @@ class MultiQLabelDisplay:
 
                 row = []
                 for split_id in range(split_count):  # loop on the line parts
-                    label = QLabel('', parent)
+                    label = self.get_label(parent)
 
                     image_path = None  # assuming no image found
 
-                    if self.game_pictures_folder is not None:  # try first with the game folder
-                        game_image_path = os.path.join(self.game_pictures_folder, split_line[split_id])
-                        image_path = search_image_extension(game_image_path)
+                    if self.game_pictures is not None:  # try first with the game folder
+                        image_path = self.game_pictures.search(split_line[split_id])
 
                     # try then with the common folder
-                    if (self.common_pictures_folder is not None) and (image_path is None):
-                        common_image_path = os.path.join(self.common_pictures_folder, split_line[split_id])
-                        image_path = search_image_extension(common_image_path)
+                    if (self.common_pictures is not None) and (image_path is None):
+                        image_path = self.common_pictures.search(split_line[split_id])
 
                     if image_path is not None:  # image found
 
@@ -532,19 +652,19 @@ class MultiQLabelDisplay:
                             if labels_settings[split_id].image_height is not None:
                                 image_height = labels_settings[split_id].image_height
 
+                        # decoded and scaled images are cached (zero size to keep the aspect ratio)
                         if image_height is not None:
                             if image_width is not None:  # scale to width and height
-                                label.setPixmap(QPixmap(image_path).scaled(image_width, image_height,
-                                                                           transformMode=Qt.SmoothTransformation))
+                                label.setPixmap(pixmap_cache.pixmap(image_path, image_width, image_height,
+                                                                    transformation=Qt.SmoothTransformation))
                             else:  # scale to height
-                                label.setPixmap(
-                                    QPixmap(image_path).scaledToHeight(image_height, mode=Qt.SmoothTransformation))
+                                label.setPixmap(pixmap_cache.pixmap(image_path, 0, image_height,
+                                                                    transformation=Qt.SmoothTransformation))
                         elif image_width is not None:  # scale to width
-                            label.setPixmap(
-                                QPixmap(image_path).scaledToWidth(image_width, mode=Qt.SmoothTransformation))
+                            label.setPixmap(pixmap_cache.pixmap(image_path, image_width, 0,
+                                                                transformation=Qt.SmoothTransformation))
                     else:  # image not found
                         label.setText(split_line[split_id])
-                        label.setFont(QFont(self.font_police, self.font_size))
 
                     if labels_settings is not None:
                         self.set_qlabel_settings(label, labels_settings[split_id])
@@ -1,7 +1,9 @@
 import bisect
 import math
 import time
-from typing import Iterable, List, Optional, Tuple, Union
+from array import array
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Tuple, Union)
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
@@ -51,6 +53,52 @@ def get_ticks(vmin: float, vmax: float, tick_number: int = 10) -> List[float]:
     return ticks
 
 
+def as_series(x: Iterable[float],
+              y: Iterable[float]) -> Tuple[array, array]:
+    """ Returns x and y as float arrays sorted by x"""
+    x = array('d', x)
+    y = array('d', y)
+    if any(x[i] > x[i + 1] for i in range(len(x) - 1)):
+        order = sorted(range(len(x)), key=x.__getitem__)
+        x = array('d', (x[i] for i in order))
+        y = array('d', (y[i] for i in order))
+    return x, y
+
+
+def decimate(x: array, y: array, start: int, end: int, x_min: float,
+             x_max: float, columns: int) -> Tuple[array, array]:
+    """ Reduces points `start:end` of a series sorted by x to at most four
+    points per pixel column (first, min, max and last). The line drawn from
+    them looks the same as with all points, including peaks.
+
+    Column boundaries are found with bisect and extremes with min/max over
+    array slices, so there is no Python loop over individual points."""
+    if end - start <= 4 * columns or x_max <= x_min:
+        return x[start:end], y[start:end]
+
+    step = (x_max - x_min) / columns
+    bisect_left = bisect.bisect_left
+    new_x = array('d')
+    new_y = array('d')
+    first = start
+    while first < end:
+        column = int((x[first] - x_min) / step)
+        last = max(bisect_left(x, x_min + (column + 1) * step, first, end),
+                   first + 1)
+        if last - first <= 4:
+            new_x.extend(x[first:last])
+            new_y.extend(y[first:last])
+        else:
+            ys = y[first:last]
+            low = first + ys.index(min(ys))
+            high = first + ys.index(max(ys))
+            for i in sorted({first, low, high, last - 1}):
+                new_x.append(x[i])
+                new_y.append(y[i])
+        first = last
+    return new_x, new_y
+
+
 class Box:
     """ Box used as a bounding box for a chart"""
     def __init__(self, x: int, y: int, width: int, height: int):
@@ -115,8 +163,31 @@ class Box:
         qp.drawRect(self.x, self.y, self.width, self.height)
 
 
+class PlotCache(NamedTuple):
+    """ Parts of the plot that change only with data or widget size"""
+    background: QtGui.QPixmap  # Box, grid, ticks, labels and title
+    series: List[Tuple[QtGui.QPolygon, QtGui.QPen, bool]]  # bool: draw points
+    texts: List[Tuple[QtCore.QRect, QtGui.QColor, str]]
+    legend_rect: QtCore.QRect
+    legend: QtGui.QPixmap
+    clip: QtCore.QRect  # Chart box
+    transform: QtGui.QTransform  # From data to image coordinates
+    x_limits: Tuple[float, float]
+
+
 class GraphWidget(QtWidgets.QWidget):
-    """ Main widget supporting graphs """
+    """ Main widget supporting graphs
+
+    Static layers and series in image coordinates are cached and rebuilt
+    only when data, visibility, x-limits or the widget size change.
+    Series are decimated to the plot width when the cache is built.
+
+    Mouse wheel zooms the x-axis, dragging pans it and double-click resets
+    the view. Hovering shows the nearest point. While zooming or panning,
+    cached series are only moved and scaled. The cache is rebuilt when
+    the drag ends or shortly after the last wheel step."""
+    REBUILD_DELAY = 150  # Milliseconds after the last zoom or pan step
+
     def __init__(self):
         super().__init__()
 
@@ -126,8 +197,39 @@ class GraphWidget(QtWidgets.QWidget):
         self.y_label: str = ""
         self._data = []
         self.x_is_timestamp: bool = False
-        # Used for limiting x-axis. Max difference in x shown from the max value.
-        self.max_x_diff: int = -1
+        self._max_x_diff: int = -1
+        self._cache: Optional[PlotCache] = None
+        # Zoomed or panned x-range (`None` to fit data)
+        self.view: Optional[Tuple[float, float]] = None
+        # Mouse x and x-limits when dragging started
+        self._drag: Optional[Tuple[int, Tuple[float, float]]] = None
+        # Hovered point (image position, x, y, color)
+        self._hover: Optional[Tuple[QtCore.QPointF, float, float,
+                                    QtGui.QColor]] = None
+        self._rebuild_timer = QtCore.QTimer(self)
+        self._rebuild_timer.setSingleShot(True)
+        self._rebuild_timer.setInterval(self.REBUILD_DELAY)
+        self._rebuild_timer.timeout.connect(self._rebuild)
+        self.setMouseTracking(True)
+
+    @property
+    def max_x_diff(self) -> int:
+        """ Used for limiting x-axis. Max difference in x shown from the max value."""
+        return self._max_x_diff
+
+    @max_x_diff.setter
+    def max_x_diff(self, value: int):
+        self._max_x_diff = value
+        self.view = None
+        self.invalidate()
+
+    def invalidate(self):
+        """ Drops cached layers. Needs to be called when data changes."""
+        self._cache = None
+
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        self.invalidate()
+        super().resizeEvent(event)
 
     def paintEvent(self, event):
         """ Override for draw event"""
@@ -144,6 +246,7 @@ class GraphWidget(QtWidgets.QWidget):
              show: bool = True,
              index: int = -1):
         """ Simple line chart"""
+        x, y = as_series(x, y)
         self._data.append({
             "type": "lineplot",
             "x": x,
@@ -153,21 +256,44 @@ class GraphWidget(QtWidgets.QWidget):
             "index": index,
             "show": show
         })
+        self.invalidate()
+
+    def append(self, index: int, x: Iterable[float],
+               y: Iterable[float]) -> bool:
+        """ Adds points to the plot with `index` (given manually).
+        Returns `False` if there is no such plot."""
+        for item in self._data:
+            if index == item.get("index", -1):
+                for xi, yi in zip(x, y):
+                    if not item['x'] or xi >= item['x'][-1]:
+                        item['x'].append(xi)
+                        item['y'].append(yi)
+                    else:
+                        i = bisect.bisect(item['x'], xi)
+                        item['x'].insert(i, xi)
+                        item['y'].insert(i, yi)
+                self.invalidate()
+                return True
+        return False
 
     def text(self, text: str, x: float, y: float, color: str = "black"):
         """ Add a text to the chart"""
         self._data.append({
             "type": "text",
             "text": text,
-            "x": (x, ),
-            "y": (y, ),
+            "x": array('d', (x, )),
+            "y": array('d', (y, )),
             "color": color,
             "show": True
         })
+        self.invalidate()
 
     def clear_data(self):
         """ Clears all current data"""
         self._data = []
+        self.view = None
+        self._hover = None
+        self.invalidate()
 
     def set_plot_visibility(self, index: int, visible: bool):
         """ Changes the visibility of the plot 
@@ -178,40 +304,45 @@ class GraphWidget(QtWidgets.QWidget):
         for item in self._data:
             if index == item.get("index", -1):
                 item["show"] = visible
+                self.invalidate()
                 return
 
+    @staticmethod
+    def _visible_range(item: Dict[str, Any], x_min: float,
+                       x_max: float) -> Tuple[int, int]:
+        """ Returns the range of indexes of `item` points between `x_min` and `x_max`"""
+        return (bisect.bisect_left(item['x'], x_min),
+                bisect.bisect_right(item['x'], x_max))
+
     def calculate_limits(self) -> Tuple[float, float, float, float]:
         """ Calculates figure limits
 
         Returns:
             (x_min, x_max, y_min, y_max) """
-
-        x_min = mmin([min(i['x']) for i in self._data if i["show"]])
-        x_max = mmax([max(i['x']) for i in self._data if i["show"]])
-
-        if self.max_x_diff > 0:
-            # In case we are limiting maximum diff from x_max
-            if x_max - x_min > self.max_x_diff:
-                x_min = x_max - self.max_x_diff
-
-            y_mins = []
-            y_maxs = []
-            for plot in self._data:
-                if not plot['show']:
-                    continue
-                y = [
-                    y for x, y in zip(plot['x'], plot['y'])
-                    if x_max - x < self.max_x_diff
-                ]
-                y_mins.append(mmin(y))
-                y_maxs.append(mmax(y))
-            y_min = mmin(y_mins)
-            y_max = mmax(y_maxs)
-        else:
-            y_min = mmin([min(i['y']) for i in self._data if i["show"]])
-            y_max = mmax([max(i['y']) for i in self._data if i["show"]])
-
-        return x_min, x_max, y_min, y_max
+        shown = [i for i in self._data if i["show"] and len(i['x'])]
+        if not shown:
+            return 0, 1, 0, 1
+
+        # Series are sorted by x
+        x_min = min(i['x'][0] for i in shown)
+        x_max = max(i['x'][-1] for i in shown)
+
+        # In case we are limiting maximum diff from x_max
+        if self.max_x_diff > 0 and x_max - x_min > self.max_x_diff:
+            x_min = x_max - self.max_x_diff
+
+        if self.view is not None:
+            x_min, x_max = self.view
+
+        y_mins = []
+        y_maxs = []
+        for item in shown:
+            start, end = self._visible_range(item, x_min, x_max)
+            if start < end:
+                y = item['y'][start:end]
+                y_mins.append(min(y))
+                y_maxs.append(max(y))
+        return x_min, x_max, mmin(y_mins), mmax(y_maxs)
 
     @staticmethod
     def _set_font(qp: QtGui.QPainter,
@@ -235,8 +366,9 @@ class GraphWidget(QtWidgets.QWidget):
     def _format_ticks(self,
                       value,
                       percent: bool = False,
-                      timestamp: bool = False) -> str:
-        if timestamp and self.max_x_diff > 0:
+                      timestamp: bool = False,
+                      span: float = 0) -> str:
+        if timestamp and (self.max_x_diff > 0 or 0 < span < 10 * 86400):
             return time.strftime("%b %d, %I:%M%p", time.localtime(value))
         if timestamp:
             return time.strftime("%b %d, %y", time.localtime(value))
@@ -256,42 +388,109 @@ class GraphWidget(QtWidgets.QWidget):
                    color: Union[QtGui.QColor,
                                 QtCore.Qt.GlobalColor] = QtCore.Qt.black):
         qp.setPen(QtGui.QPen(color, linewidth, linestyle))
-        for idx, point in enumerate(points):
-            # Skip the first one
-            if not idx:
-                continue
-            qp.drawLine(*points[idx - 1], *point)
+        qp.drawPolyline(
+            QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in points]))
 
-    def _draw_plot(self):
-        qp = QtGui.QPainter()
-        qp.begin(self)
-        qp.setPen(QtGui.QColor(0, 0, 0))
+    @staticmethod
+    def _new_pixmap(width: int, height: int, ratio: float) -> QtGui.QPixmap:
+        """ Creates a transparent pixmap for the given device pixel ratio"""
+        pixmap = QtGui.QPixmap(int(width * ratio), int(height * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QtCore.Qt.transparent)
+        return pixmap
 
-        # Bounding box
+    @staticmethod
+    def _box(width: int, height: int) -> Box:
+        """ Bounding box of the chart"""
         x_offset_left = 80
         x_offset_right = 20
         y_offset_top = 25
         y_offset_bottom = 50
-        box_width = self.width() - x_offset_left - x_offset_right
-        box_height = self.height() - y_offset_top - y_offset_bottom
+        box_width = width - x_offset_left - x_offset_right
+        box_height = height - y_offset_top - y_offset_bottom
+        return Box(x_offset_left, y_offset_top, box_width, box_height)
 
-        box = Box(x_offset_left, y_offset_top, box_width, box_height)
-        box.draw(qp, edge_color="#000", fill_color=self.background_color)
+    def _build_cache(self, width: int, height: int,
+                     ratio: float) -> PlotCache:
+        """ Draws static layers and transforms series into image coordinates
+        for a plot of `width` x `height` and the device pixel `ratio`"""
+        box = self._box(width, height)
 
         # Calculate xlim, ylim
         x_min, x_max, y_min, y_max = self.calculate_limits()
 
         # Transforming into image coordinates
-        x_scaling = box.inner_width / (x_max - x_min)
+        x_diff = x_max - x_min
+        x_scaling = box.inner_width / (x_diff if x_diff else 1)
         y_diff = y_max - y_min
         y_diff = y_diff if y_diff else 1
         y_scaling = box.inner_heigth / y_diff
+        transform = QtGui.QTransform(x_scaling, 0, 0, -y_scaling,
+                                     box.x_start - x_min * x_scaling,
+                                     box.y_end + y_min * y_scaling)
 
         def trans(x: float, y: float) -> Tuple[int, int]:
             """ Transforms a point from data to coordinates on image"""
-            x_new = (x - x_min) * x_scaling + box.x_start
-            y_new = box.y_end - (y - y_min) * y_scaling
-            return int(x_new), int(y_new)
+            point = transform.map(QtCore.QPointF(x, y))
+            return int(point.x()), int(point.y())
+
+        background = self._new_pixmap(width, height, ratio)
+        qp = QtGui.QPainter(background)
+        self._draw_background(qp, box, (x_min, x_max, y_min, y_max), trans,
+                              height)
+        qp.end()
+
+        # Series. When there is data outside of the view, include a view
+        # width on each side, so panning and zooming out can move cached
+        # series before the cache is rebuilt.
+        margin = x_diff if self.view is not None or self.max_x_diff > 0 else 0
+        series = []
+        texts = []
+        for idx, data in enumerate(self._data):
+            if not data["show"]:
+                continue
+            elif data["type"] == "lineplot":
+                start, end = self._visible_range(data, x_min, x_max)
+                # For limited range or sparse points draw points as well
+                draw_points = self.max_x_diff > 0 or (
+                    self.view is not None
+                    and (end - start) * 10 < box.inner_width)
+                # Include one point on each side so lines reach the edges
+                start, end = self._visible_range(data, x_min - margin,
+                                                 x_max + margin)
+                start = max(start - 1, 0)
+                end = min(end + 1, len(data['x']))
+                # Draw at most a few points per pixel column
+                columns = box.inner_width * (3 if margin else 1)
+                xs, ys = decimate(data['x'], data['y'], start, end,
+                                  x_min - margin, x_max + margin, columns)
+                # Transform all points in one call
+                polygon = transform.map(
+                    QtGui.QPolygonF(list(map(QtCore.QPointF, xs,
+                                             ys)))).toPolygon()
+                pen = QtGui.QPen(QtGui.QColor(*COLORS[idx % len(COLORS)]),
+                                 data['linewidth'])
+                series.append((polygon, pen, draw_points))
+
+            elif data["type"] == "text":
+                point = trans(data['x'][0], data['y'][0])
+                texts.append((QtCore.QRect(*point, 200, 20),
+                              QtGui.QColor(data['color']), data['text']))
+
+        legend_rect, legend = self._draw_legend(box,
+                                                [pen for _, pen, _ in series],
+                                                ratio)
+        return PlotCache(background, series, texts, legend_rect, legend,
+                         QtCore.QRect(box.x, box.y, box.width, box.height),
+                         transform, (x_min, x_max))
+
+    def _draw_background(self, qp: QtGui.QPainter, box: Box,
+                         limits: Tuple[float, float, float, float],
+                         trans: Callable[[float, float], Tuple[int, int]],
+                         height: int):
+        """ Draws the box, ticks, grid, axis labels and the title"""
+        x_min, x_max, y_min, y_max = limits
+        box.draw(qp, edge_color="#000", fill_color=self.background_color)
 
         # X-ticks
         x_ticks = get_ticks(x_min, x_max, 5)
@@ -299,11 +498,14 @@ class GraphWidget(QtWidgets.QWidget):
         for x in x_ticks:
             xn, _ = trans(x, y_min)
             xn1 = (xn, box.y_end + box.padding + 1)
-            xn2 = (xn, int(xn1[1] + self.height() / 100))
+            xn2 = (xn, int(xn1[1] + height / 100))
             self._draw_line(qp, [xn1, xn2], linewidth=1)
             rect = QtCore.QRect(xn - 100, box.y + box.height, 200, 30)
-            qp.drawText(rect, QtCore.Qt.AlignCenter,
-                        self._format_ticks(x, timestamp=self.x_is_timestamp))
+            qp.drawText(
+                rect, QtCore.Qt.AlignCenter,
+                self._format_ticks(x,
+                                   timestamp=self.x_is_timestamp,
+                                   span=x_max - x_min))
 
             # Grid
             self._draw_line(qp, [(xn, box.y + 1),
@@ -316,7 +518,7 @@ class GraphWidget(QtWidgets.QWidget):
         for y in y_ticks:
             _, yn = trans(x_min, y)
             yn1 = (box.x, yn)
-            yn2 = (int(box.x - self.height() / 100), yn)
+            yn2 = (int(box.x - height / 100), yn)
             self._draw_line(qp, [yn1, yn2], linewidth=1)
             rect = QtCore.QRect(box.x - 110, yn - 16, 100, 30)
             qp.drawText(rect, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
@@ -327,70 +529,13 @@ class GraphWidget(QtWidgets.QWidget):
                             linewidth=1,
                             color=QtGui.QColor("#c9c9c9"))
 
-        # Draw data
-        used_colors = []
-        self._set_font(qp, 10)
-        for idx, data in enumerate(self._data):
-            if not data["show"]:
-                continue
-            elif data["type"] == "lineplot":
-                points = [
-                    trans(x, y) for x, y in zip(data['x'], data['y'])
-                    if self.max_x_diff <= 0 or x_max - x < self.max_x_diff
-                ]
-                used_colors.append(QtGui.QColor(*COLORS[idx % len(COLORS)]))
-                self._draw_line(qp,
-                                points,
-                                color=used_colors[-1],
-                                linewidth=data['linewidth'])
-
-                # For limited range draw points as well
-                if self.max_x_diff > 0:
-                    qp.setPen(QtGui.QPen(QtCore.Qt.black, 3))
-                    [qp.drawEllipse(x - 2, y - 2, 4, 4) for x, y in points]
-
-            elif data["type"] == "text":
-                point = trans(data['x'][0], data['y'][0])
-                rect = QtCore.QRect(*point, 200, 20)
-                qp.setPen(QtGui.QColor(data['color']))
-                qp.drawText(rect, QtCore.Qt.AlignCenter, data['text'])
-
-        # Legend
-        labels = [
-            len(i['label']) for i in self._data
-            if i['type'] != "text" and i["show"]
-        ]
-        item_num = len(labels)
-        text_len = max(labels) if labels else 0
-        qp.setBrush(QtGui.QColor("#fff"))
-        qp.setPen(QtGui.QColor("black"))
-        textbox = QtCore.QRect(box.x_start + box.width // 200,
-                               box.y_start + box.width // 200,
-                               35 + text_len * 7, 27 * item_num)
-        qp.drawRect(textbox)
-        textbox.setLeft(textbox.left() + 30)
-        textbox.setTop(textbox.top() + 5)
-
-        i = 0
-        for item in self._data:
-            if not item["show"] or item["type"] == "text":
-                continue
-            points = [(textbox.x() - 20, textbox.y() + 10),
-                      (textbox.x() + -5, textbox.y() + 10)]
-            self._draw_line(qp, points, color=used_colors[i], linewidth=4)
-            self._set_font(qp, 10)
-            qp.drawText(textbox, QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop,
-                        item["label"])
-            textbox.setTop(textbox.top() + 25)
-            i += 1
-
         # Change font for axis labels
         self._set_font(qp, 12)
 
         # X-label
         qp.setPen(QtGui.QColor("black"))
         rect = QtCore.QRect(box.x + box.width // 2 - 100,
-                            self.height() - 25, 200, 25)
+                            height - 25, 200, 25)
         qp.drawText(rect, QtCore.Qt.AlignCenter, self.x_label)
 
         # Y-label
@@ -405,4 +550,248 @@ class GraphWidget(QtWidgets.QWidget):
         qp.drawText(rect, QtCore.Qt.AlignTop | QtCore.Qt.AlignHCenter,
                     self.title)
 
+    def _draw_legend(
+            self, box: Box, pens: List[QtGui.QPen],
+            ratio: float) -> Tuple[QtCore.QRect, QtGui.QPixmap]:
+        """ Draws the legend into a pixmap. Returns its position and the pixmap."""
+        labels = [
+            i['label'] for i in self._data
+            if i['type'] != "text" and i["show"]
+        ]
+        text_len = max(len(i) for i in labels) if labels else 0
+        rect = QtCore.QRect(box.x_start + box.width // 200,
+                            box.y_start + box.width // 200,
+                            35 + text_len * 7, 27 * len(labels))
+        legend = self._new_pixmap(rect.width() + 1, rect.height() + 1, ratio)
+        qp = QtGui.QPainter(legend)
+        qp.setBrush(QtGui.QColor("#fff"))
+        qp.setPen(QtGui.QColor("black"))
+        qp.drawRect(0, 0, rect.width(), rect.height())
+
+        textbox = QtCore.QRect(30, 5, rect.width() - 30, rect.height() - 5)
+        for label, pen in zip(labels, pens):
+            points = [(textbox.x() - 20, textbox.y() + 10),
+                      (textbox.x() + -5, textbox.y() + 10)]
+            self._draw_line(qp, points, color=pen.color(), linewidth=4)
+            self._set_font(qp, 10)
+            qp.drawText(textbox, QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop,
+                        label)
+            textbox.setTop(textbox.top() + 25)
+        qp.end()
+        return rect, legend
+
+    def _draw_plot(self):
+        if self._cache is None:
+            self._cache = self._build_cache(self.width(), self.height(),
+                                            self.devicePixelRatioF())
+        qp = QtGui.QPainter()
+        qp.begin(self)
+        self._paint(qp, self._cache, self._interim_transform(self._cache))
+        if self._hover is not None:
+            self._draw_hover(qp, self._cache)
         qp.end()
+
+    def render_image(self,
+                     width: Optional[int] = None,
+                     height: Optional[int] = None) -> QtGui.QImage:
+        """ Renders the graph to an image of any size (widget size by default).
+        Works without showing the widget, e.g. under the `offscreen` Qt platform."""
+        width = width or self.width()
+        height = height or self.height()
+        image = QtGui.QImage(width, height,
+                             QtGui.QImage.Format_ARGB32_Premultiplied)
+        image.fill(self.palette().window().color())
+        qp = QtGui.QPainter(image)
+        self._paint(qp, self._build_cache(width, height, 1))
+        qp.end()
+        return image
+
+    def save_image(self,
+                   path: str,
+                   width: Optional[int] = None,
+                   height: Optional[int] = None) -> bool:
+        """ Renders the graph and saves it (format based on the extension)"""
+        return self.render_image(width, height).save(path)
+
+    def contextMenuEvent(self, event: QtGui.QContextMenuEvent):
+        menu = QtWidgets.QMenu(self)
+        save = menu.addAction("Save as image")
+        if menu.exec_(event.globalPos()) == save:
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self, "Save as image", "graph.png", "Images (*.png *.jpg)")
+            if path and not self.save_image(path):
+                logger.warning(f"Failed to save graph to {path}")
+
+    def _interim_transform(self,
+                           cache: PlotCache) -> Optional[QtGui.QTransform]:
+        """ Returns the transform moving cached series from the cached
+        x-limits to the current view (`None` if they are the same).
+        Used while zooming or panning before the cache is rebuilt."""
+        if self.view is None or self.view == cache.x_limits:
+            return None
+        x_min, x_max = cache.x_limits
+        view_min, view_max = self.view
+        if x_max <= x_min or view_max <= view_min:
+            return None
+        scale = (x_max - x_min) / (view_max - view_min)
+        # Image x of the chart start stays, data x `view_min` is moved there
+        start = cache.transform.map(QtCore.QPointF(x_min, 0)).x()
+        offset = start - scale * cache.transform.map(
+            QtCore.QPointF(view_min, 0)).x()
+        return QtGui.QTransform(scale, 0, 0, 1, offset, 0)
+
+    def _transform(self) -> QtGui.QTransform:
+        """ Returns the transform from data to the shown image coordinates"""
+        interim = self._interim_transform(self._cache)
+        if interim is None:
+            return self._cache.transform
+        return self._cache.transform * interim
+
+    def _paint(self,
+               qp: QtGui.QPainter,
+               cache: PlotCache,
+               interim: Optional[QtGui.QTransform] = None):
+        """ Paints cached layers and series. `interim` moves cached series
+        and texts to the current view."""
+        qp.drawPixmap(0, 0, cache.background)
+
+        # Draw data
+        qp.setClipRect(cache.clip)
+        for polygon, pen, draw_points in cache.series:
+            if interim is not None:
+                polygon = interim.map(polygon)
+            qp.setPen(pen)
+            qp.drawPolyline(polygon)
+
+            if draw_points:
+                qp.setPen(QtGui.QPen(QtCore.Qt.black, 3))
+                for point in polygon:
+                    qp.drawEllipse(point, 2, 2)
+
+        self._set_font(qp, 10)
+        for rect, color, text in cache.texts:
+            if interim is not None:
+                rect = rect.translated(
+                    interim.map(rect.topLeft()) - rect.topLeft())
+            qp.setPen(color)
+            qp.drawText(rect, QtCore.Qt.AlignCenter, text)
+
+        qp.drawPixmap(cache.legend_rect.topLeft(), cache.legend)
+        qp.setClipping(False)
+
+    def _draw_hover(self, qp: QtGui.QPainter, cache: PlotCache):
+        """ Draws crosshair and values of the hovered point"""
+        point, x, y, color = self._hover
+        qp.setPen(QtGui.QPen(QtGui.QColor("#555"), 1, QtCore.Qt.DashLine))
+        qp.drawLine(QtCore.QPointF(cache.clip.left(), point.y()),
+                    QtCore.QPointF(cache.clip.right(), point.y()))
+        qp.drawLine(QtCore.QPointF(point.x(), cache.clip.top()),
+                    QtCore.QPointF(point.x(), cache.clip.bottom()))
+        qp.setPen(QtGui.QPen(QtCore.Qt.black, 1))
+        qp.setBrush(color)
+        qp.drawEllipse(point, 5, 5)
+
+        if self.x_is_timestamp:
+            x_text = time.strftime("%b %d %Y, %H:%M", time.localtime(x))
+        else:
+            x_text = self._format_ticks(x)
+        text = f"{x_text}\n{self.y_label or 'y'}: {self._format_ticks(y)}"
+        self._set_font(qp, 10)
+        rect = qp.fontMetrics().boundingRect(QtCore.QRect(0, 0, 400, 100), 0,
+                                             text).adjusted(-5, -3, 5, 3)
+        # Place the label next to the point, inside the chart
+        rect.moveTopLeft(QtCore.QPoint(int(point.x()) + 10, int(point.y()) + 10))
+        if rect.right() > cache.clip.right():
+            rect.moveRight(int(point.x()) - 10)
+        if rect.bottom() > cache.clip.bottom():
+            rect.moveBottom(int(point.y()) - 10)
+        qp.setBrush(QtGui.QColor(255, 255, 255, 220))
+        qp.drawRect(rect)
+        qp.drawText(rect, QtCore.Qt.AlignCenter, text)
+
+    def nearest_point(
+        self, pos: QtCore.QPoint, max_distance: float = 40
+    ) -> Optional[Tuple[QtCore.QPointF, float, float, QtGui.QColor]]:
+        """ Finds the shown point nearest to `pos` (in image coordinates)"""
+        if self._cache is None:
+            return None
+        transform = self._transform()
+        data_x = transform.inverted()[0].map(QtCore.QPointF(pos)).x()
+        best = None
+        best_distance = max_distance
+        for idx, item in enumerate(self._data):
+            if not item["show"] or item["type"] != "lineplot":
+                continue
+            # Sorted x, so only the neighbours of the insertion point matter
+            i = bisect.bisect_left(item['x'], data_x)
+            for j in (i - 1, i):
+                if not 0 <= j < len(item['x']):
+                    continue
+                point = transform.map(
+                    QtCore.QPointF(item['x'][j], item['y'][j]))
+                distance = math.hypot(point.x() - pos.x(),
+                                      point.y() - pos.y())
+                if distance < best_distance:
+                    best_distance = distance
+                    best = (point, item['x'][j], item['y'][j],
+                            QtGui.QColor(*COLORS[idx % len(COLORS)]))
+        return best
+
+    def zoom(self, factor: float, center: Optional[float] = None):
+        """ Zooms x-axis by `factor` (<1 zooms in) around `center` (data x)"""
+        if self._cache is None:
+            return
+        x_min, x_max = self.view or self._cache.x_limits
+        if center is None:
+            center = (x_min + x_max) / 2
+        self.view = (center - (center - x_min) * factor,
+                     center + (x_max - center) * factor)
+        self._rebuild_timer.start()
+        self.update()
+
+    def reset_view(self):
+        self.view = None
+        self._rebuild()
+
+    def _rebuild(self):
+        """ Rebuilds the cache for the current view"""
+        self._rebuild_timer.stop()
+        self.invalidate()
+        self.update()
+
+    def wheelEvent(self, event: QtGui.QWheelEvent):
+        if self._cache is None:
+            return
+        center = self._transform().inverted()[0].map(
+            QtCore.QPointF(event.pos())).x()
+        self.zoom(0.85**(event.angleDelta().y() / 120), center)
+        self._hover = None
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent):
+        if event.button() == QtCore.Qt.LeftButton and self._cache is not None:
+            self._drag = (event.pos().x(), self.view or self._cache.x_limits)
+            self.setCursor(QtCore.Qt.ClosedHandCursor)
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
+        if event.button() == QtCore.Qt.LeftButton and self._drag is not None:
+            self._drag = None
+            self.unsetCursor()
+            self._rebuild()
+
+    def mouseDoubleClickEvent(self, event: QtGui.QMouseEvent):
+        self.reset_view()
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+        if self._drag is not None and self._cache is not None:
+            start_x, (x_min, x_max) = self._drag
+            shift = (event.pos().x() - start_x) / self._transform().m11()
+            self.view = (x_min - shift, x_max - shift)
+            self._hover = None
+            self._rebuild_timer.start()
+        else:
+            self._hover = self.nearest_point(event.pos())
+        self.update()
+
+    def leaveEvent(self, event: QtCore.QEvent):
+        self._hover = None
+        self.update()
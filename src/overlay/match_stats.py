@@ -0,0 +1,508 @@
+"""
+Statistics computed from aoe4world match history
+
+Matches are reduced to compact `GameRecord`s and aggregated incrementally,
+so filtering doesn't need to go through all games again.
+"""
+
+import bisect
+import itertools
+import math
+import time
+from array import array
+from collections import deque
+from datetime import datetime, timezone
+from typing import (Any, Callable, Deque, Dict, List, NamedTuple, Optional,
+                    Set, Tuple)
+
+from overlay.aoe4_data import civ_data, mode_data
+from overlay.match_store import main_player, match_store, opponent_columns
+
+# aoe4world civilization name (e.g. "holy_roman_empire") to `civ_data` index
+CIV_INDEX = {
+    name.lower().replace(" ", "_"): idx
+    for idx, name in civ_data.items()
+}
+MODES = tuple(mode_data)  # Leaderboard ids (17 for 1v1, ...)
+
+
+class GameRecord(NamedTuple):
+    """ Data about a single finished game from the main player's view"""
+    game_id: int
+    started: float  # Timestamp
+    civ: int  # Index to `civ_data`
+    map: str
+    mode: int  # Leaderboard id (17 for 1v1, ...)
+    win: bool
+    rating: Optional[int]  # After the game
+    opponent_civs: Tuple[int, ...] = ()  # Indexes to `civ_data`
+    opponent_rating: Optional[int] = None  # Average of opponents
+    kind: str = ""  # aoe4world game kind ("rm_1v1", "qm_2v2", ...)
+
+
+def parse_started(started_at: str) -> float:
+    """ Returns timestamp for aoe4world time ("2022-06-01T18:30:12.000Z").
+    Faster than `strptime`."""
+    return datetime.fromisoformat(
+        started_at[:19]).replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_civs(civs: Optional[str]) -> Tuple[int, ...]:
+    """ Returns civ indexes for comma separated aoe4world civilization names"""
+    if not civs:
+        return ()
+    return tuple(CIV_INDEX[civ] for civ in civs.split(",") if civ in CIV_INDEX)
+
+
+def rating_after(rating: Optional[int],
+                 rating_diff: Optional[int]) -> Optional[int]:
+    """ Returns player rating after the game (aoe4world shows rating before it)"""
+    if rating is None:
+        return None
+    return rating + (rating_diff or 0)
+
+
+def match_leaderboard(match: Dict[str, Any]) -> Optional[int]:
+    """ Returns leaderboard id (e.g. 17 for 1v1) for aoe4world match data"""
+    try:
+        size = int(match['kind'].split('_')[-1].split('v')[0])
+    except (KeyError, ValueError):
+        teams = match.get('teams', [])
+        size = len(teams[0]) if teams else 0
+    leaderboard_id = 16 + size
+    return leaderboard_id if leaderboard_id in mode_data else None
+
+
+def ranked_kind(mode: int) -> str:
+    """ Returns aoe4world ranked game kind for a leaderboard id (17 -> "rm_1v1")"""
+    return f"rm_{mode - 16}v{mode - 16}"
+
+
+def game_record(match: Dict[str, Any],
+                profile_id: Optional[int]) -> Optional[GameRecord]:
+    """ Creates a game record from aoe4world match data.
+    Returns `None` for games that can't be used for statistics."""
+    if match.get('ongoing'):
+        return None
+    player = main_player(match, profile_id)
+    if player.get('result') not in {"win", "loss"}:
+        return None
+    civ = CIV_INDEX.get(player.get('civilization'))
+    mode = match_leaderboard(match)
+    if civ is None or mode is None:
+        return None
+    opponent_civs, opponent_rating = opponent_columns(match, profile_id)
+    return GameRecord(match['game_id'], parse_started(match['started_at']),
+                      civ,
+                      match.get('map') or "Unknown Map", mode,
+                      player['result'] == "win",
+                      rating_after(player.get('rating'),
+                                   player.get('rating_diff')),
+                      parse_civs(opponent_civs), opponent_rating,
+                      match.get('kind') or "")
+
+
+def record_from_columns(row: Tuple[Any, ...]) -> Optional[GameRecord]:
+    """ Creates a game record from a row of `MatchStore.get_columns`"""
+    (game_id, started_at, kind, map_name, civ, result, rating, rating_diff,
+     opponent_civs, opponent_rating) = row
+    civ = CIV_INDEX.get(civ)
+    mode = match_leaderboard({'kind': kind or ""})
+    if civ is None or mode is None or result not in {"win", "loss"}:
+        return None
+    return GameRecord(game_id, parse_started(started_at), civ, map_name
+                      or "Unknown Map", mode, result == "win",
+                      rating_after(rating, rating_diff),
+                      parse_civs(opponent_civs), opponent_rating, kind or "")
+
+
+def wilson_interval(wins: int,
+                    games: int,
+                    z: float = 1.96) -> Tuple[float, float]:
+    """ Returns Wilson score interval of the winrate (95% by default)"""
+    if not games:
+        return 0, 1
+    p = wins / games
+    denominator = 1 + z**2 / games
+    center = (p + z**2 / (2 * games)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / games + z**2 /
+                           (4 * games**2)) / denominator
+    return max(0, center - margin), min(1, center + margin)
+
+
+class StatsCube:
+    """ Win and loss counts indexed by map, mode and civilization
+
+    Counts are kept in a flat array laid out as [map][mode][civ][loss, win].
+    Maps are added when first seen. Adding a game is O(1) and any filter
+    is answered by summing the counts, independent of the number of games."""
+
+    def __init__(self):
+        self.civ_count = len(civ_data)
+        self.mode_count = len(MODES)
+        self.map_size = self.mode_count * self.civ_count * 2
+        self.maps: Dict[str, int] = dict()
+        self.counts = array('l')
+
+    def clear(self):
+        self.maps = dict()
+        self.counts = array('l')
+
+    def _map_index(self, map_name: str) -> int:
+        if map_name not in self.maps:
+            self.maps[map_name] = len(self.maps)
+            self.counts.extend(array('l', [0]) * self.map_size)
+        return self.maps[map_name]
+
+    def _offset(self, map_index: int, mode_index: int) -> int:
+        return (map_index * self.mode_count + mode_index) * self.civ_count * 2
+
+    def add(self, record: GameRecord):
+        """ Adds a game to counts"""
+        offset = self._offset(self._map_index(record.map),
+                              MODES.index(record.mode))
+        self.counts[offset + record.civ * 2 + record.win] += 1
+
+    def remove(self, record: GameRecord):
+        """ Removes a previously added game from counts"""
+        offset = self._offset(self.maps[record.map], MODES.index(record.mode))
+        self.counts[offset + record.civ * 2 + record.win] -= 1
+
+    def _blocks(self, mode: Optional[int]):
+        """ Yields map name and civ counts for each map and selected modes"""
+        modes = range(self.mode_count) if mode is None else (
+            MODES.index(mode), )
+        for map_name, map_index in self.maps.items():
+            for mode_index in modes:
+                offset = self._offset(map_index, mode_index)
+                yield map_name, self.counts[offset:offset + self.civ_count * 2]
+
+    def civ_stats(self,
+                  mode: Optional[int] = None) -> List[Tuple[int, int]]:
+        """ Returns (wins, losses) for each civilization index"""
+        wins = [0] * self.civ_count
+        losses = [0] * self.civ_count
+        for _, block in self._blocks(mode):
+            wins = [a + b for a, b in zip(wins, block[1::2])]
+            losses = [a + b for a, b in zip(losses, block[0::2])]
+        return list(zip(wins, losses))
+
+    def map_stats(self,
+                  mode: Optional[int] = None,
+                  civ: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+        """ Returns (wins, losses) for each map"""
+        result = {map_name: (0, 0) for map_name in self.maps}
+        for map_name, block in self._blocks(mode):
+            if civ is None:
+                wins, losses = sum(block[1::2]), sum(block[0::2])
+            else:
+                wins, losses = block[civ * 2 + 1], block[civ * 2]
+            result[map_name] = (result[map_name][0] + wins,
+                                result[map_name][1] + losses)
+        return result
+
+    def total(self,
+              mode: Optional[int] = None,
+              civ: Optional[int] = None) -> Tuple[int, int]:
+        """ Returns total (wins, losses)"""
+        wins = losses = 0
+        for _, block in self._blocks(mode):
+            if civ is None:
+                wins += sum(block[1::2])
+                losses += sum(block[0::2])
+            else:
+                wins += block[civ * 2 + 1]
+                losses += block[civ * 2]
+        return wins, losses
+
+
+class RollingWindow:
+    """ Stats of the latest games limited by their number and/or their age
+
+    Games are kept ordered by start time. Adding a game evicts those that
+    fell out of the window and updates the counts only for games entering
+    and leaving, so the cost doesn't depend on the size of the history."""
+
+    def __init__(self,
+                 name: str,
+                 games: Optional[int] = None,
+                 days: Optional[int] = None,
+                 clock: Callable[[], float] = time.time):
+        self.name = name
+        self.games = games
+        self.seconds = days * 86400 if days else None
+        self.clock = clock
+        self.cube = StatsCube()
+        self.records: Deque[GameRecord] = deque()
+        self.game_ids: Set[int] = set()
+
+    def clear(self):
+        self.cube.clear()
+        self.records.clear()
+        self.game_ids.clear()
+
+    @staticmethod
+    def _key(record: GameRecord) -> Tuple[float, int]:
+        return record.started, record.game_id
+
+    def _too_old(self, record: GameRecord) -> bool:
+        if self.seconds and record.started < self.clock() - self.seconds:
+            return True
+        return bool(self.games and len(self.records) >= self.games
+                    and self._key(record) < self._key(self.records[0]))
+
+    def add(self, record: GameRecord):
+        if record.game_id in self.game_ids or self._too_old(record):
+            return
+        key = self._key(record)
+        if not self.records or key > self._key(self.records[-1]):
+            self.records.append(record)
+        elif key < self._key(self.records[0]):
+            # Loading history newest first
+            self.records.appendleft(record)
+        else:
+            keys = [self._key(r) for r in self.records]
+            self.records.insert(bisect.bisect(keys, key), record)
+        self.game_ids.add(record.game_id)
+        self.cube.add(record)
+        self.evict()
+
+    def evict(self):
+        """ Removes the oldest games outside of the window"""
+        while self.games and len(self.records) > self.games:
+            self._pop()
+        if self.seconds:
+            oldest = self.clock() - self.seconds
+            while self.records and self.records[0].started < oldest:
+                self._pop()
+
+    def record(self) -> str:
+        """ Returns the record of games in the window (e.g. "Last 20: 14-6")"""
+        wins, losses = self.cube.total()
+        return f"Last {wins + losses}: {wins}-{losses}" if wins + losses else ""
+
+    def _pop(self):
+        record = self.records.popleft()
+        self.game_ids.discard(record.game_id)
+        self.cube.remove(record)
+
+
+class WinStreaks:
+    """ Longest win streak for each mode
+
+    Results are kept ordered by start time. Streaks are counted again only
+    for modes with new games and only when they are requested."""
+
+    def __init__(self):
+        self.keys: Dict[int, List[Tuple[float, int]]] = dict()
+        self.wins: Dict[int, List[bool]] = dict()
+        self.streaks: Dict[int, int] = dict()
+        self.changed: Set[int] = set()  # Modes with games added since counting
+
+    def clear(self):
+        self.keys = dict()
+        self.wins = dict()
+        self.streaks = dict()
+        self.changed = set()
+
+    def add(self, record: GameRecord):
+        key = record.started, record.game_id
+        keys = self.keys.setdefault(record.mode, [])
+        wins = self.wins.setdefault(record.mode, [])
+        if not keys or key > keys[-1]:
+            keys.append(key)
+            wins.append(record.win)
+        else:
+            index = bisect.bisect(keys, key)
+            keys.insert(index, key)
+            wins.insert(index, record.win)
+        self.changed.add(record.mode)
+
+    def longest(self, mode: int) -> int:
+        """ Returns the longest win streak for a mode"""
+        if mode in self.changed:
+            self.changed.discard(mode)
+            self.streaks[mode] = max(
+                (sum(1 for _ in group)
+                 for win, group in itertools.groupby(self.wins[mode]) if win),
+                default=0)
+        return self.streaks.get(mode, 0)
+
+
+def rolling_windows(
+        extra_games: Tuple[int, ...] = ()) -> Dict[str, RollingWindow]:
+    """ Returns rolling windows shown in stats. `extra_games` adds windows
+    for other numbers of latest games."""
+    windows = [
+        RollingWindow(f"Last {games} games", games=games)
+        for games in sorted({20, 50, 100, *extra_games})
+    ]
+    windows.extend(
+        RollingWindow(f"Last {days} days", days=days) for days in (7, 30))
+    return {window.name: window for window in windows}
+
+
+class PlayerStats:
+    """ Stats of all games and of rolling windows, the longest win streak
+    for each mode and the current and the highest rating for each game kind
+    (quick match and ranked games of the same mode have separate ratings)"""
+
+    def __init__(self, extra_games: Tuple[int, ...] = ()):
+        self.game_ids: Set[int] = set()
+        self.cube = StatsCube()
+        self.windows = rolling_windows(extra_games)
+        self.current_rating: Dict[str, Tuple[float, int]] = dict()
+        self.max_rating: Dict[str, int] = dict()
+        self.streaks = WinStreaks()
+
+    def add(self, record: GameRecord) -> bool:
+        """ Adds a game. Returns `False` if it was already added."""
+        if record.game_id in self.game_ids:
+            return False
+        self.game_ids.add(record.game_id)
+        self.cube.add(record)
+        for window in self.windows.values():
+            window.add(record)
+        self.streaks.add(record)
+        if record.rating is not None and record.kind:
+            current = self.current_rating.get(record.kind)
+            if current is None or record.started > current[0]:
+                self.current_rating[record.kind] = (record.started,
+                                                    record.rating)
+            self.max_rating[record.kind] = max(
+                self.max_rating.get(record.kind, record.rating), record.rating)
+        return True
+
+
+class MatchupMatrix:
+    """ Win and loss counts of my civilization against opponent civilizations
+
+    Counts are kept in a flat array laid out as [mode][civ][opponent civ][loss, win].
+    In team games each opponent counts as one matchup, so a team game adds
+    several outcomes that aren't independent."""
+
+    def __init__(self):
+        self.civ_count = len(civ_data)
+        self.mode_size = self.civ_count * self.civ_count * 2
+        self.counts = array('l', [0]) * (len(MODES) * self.mode_size)
+        self.game_ids: Set[int] = set()
+        self.mode_games = array('l', [0]) * len(MODES)  # Games with matchups
+
+    def add(self, record: GameRecord) -> bool:
+        """ Adds a game to counts. Returns `False` if it was already added."""
+        if record.game_id in self.game_ids:
+            return False
+        self.game_ids.add(record.game_id)
+        if record.opponent_civs:
+            self.mode_games[MODES.index(record.mode)] += 1
+        offset = MODES.index(record.mode) * self.mode_size
+        for opponent_civ in record.opponent_civs:
+            self.counts[offset +
+                        (record.civ * self.civ_count + opponent_civ) * 2 +
+                        record.win] += 1
+        return True
+
+    def matrix(self, mode: Optional[int] = None) -> List[List[Tuple[int, int]]]:
+        """ Returns (wins, losses) indexed by my civ and opponent civ"""
+        modes = range(len(MODES)) if mode is None else (MODES.index(mode), )
+        size = self.civ_count * self.civ_count
+        wins = [0] * size
+        losses = [0] * size
+        for mode_index in modes:
+            block = self.counts[mode_index * self.mode_size:(mode_index + 1) *
+                                self.mode_size]
+            wins = [a + b for a, b in zip(wins, block[1::2])]
+            losses = [a + b for a, b in zip(losses, block[0::2])]
+        return [
+            list(
+                zip(wins[civ * self.civ_count:(civ + 1) * self.civ_count],
+                    losses[civ * self.civ_count:(civ + 1) * self.civ_count]))
+            for civ in range(self.civ_count)
+        ]
+
+    def games(self, mode: Optional[int] = None) -> int:
+        """ Returns the number of games with known opponent civilizations"""
+        if mode is None:
+            return sum(self.mode_games)
+        return self.mode_games[MODES.index(mode)]
+
+
+def load_matchups(profile_id: int) -> MatchupMatrix:
+    """ Builds matchup matrix from all stored games. Meant to run in a worker."""
+    matchups = MatchupMatrix()
+    for row in match_store.get_columns(profile_id):
+        record = record_from_columns(row)
+        if record is not None:
+            matchups.add(record)
+    return matchups
+
+
+def load_player_stats(profile_id: int,
+                      extra_games: Tuple[int, ...] = ()) -> PlayerStats:
+    """ Builds player stats from all stored games. Meant to run in a worker."""
+    stats = PlayerStats(extra_games)
+    for row in match_store.get_columns(profile_id):
+        record = record_from_columns(row)
+        if record is not None:
+            stats.add(record)
+    return stats
+
+
+class RatingPoint(NamedTuple):
+    """ Player rating after a single game"""
+    game_id: int
+    started: float  # Timestamp
+    kind: str  # aoe4world game kind ("rm_1v1", "qm_2v2", ...)
+    rating: int
+
+
+def rating_point(match: Dict[str, Any],
+                 profile_id: Optional[int]) -> Optional[RatingPoint]:
+    """ Creates a rating point from aoe4world match data.
+    Returns `None` for unfinished games and games without rating."""
+    if match.get('ongoing') or not match.get('kind'):
+        return None
+    player = main_player(match, profile_id)
+    rating = rating_after(player.get('rating'), player.get('rating_diff'))
+    if rating is None:
+        return None
+    return RatingPoint(match['game_id'], parse_started(match['started_at']),
+                       match['kind'], rating)
+
+
+class RatingHistory:
+    """ Rating after each game as a time series for each game kind
+
+    Series are float arrays sorted by time. Points of new games are appended,
+    so the history grows without going through the stored games again."""
+
+    def __init__(self):
+        self.series: Dict[str, Tuple[array, array]] = dict()
+        self.game_ids: Set[int] = set()
+
+    def add(self, point: RatingPoint) -> bool:
+        """ Adds a point. Returns `False` if the game was already added."""
+        if point.game_id in self.game_ids:
+            return False
+        self.game_ids.add(point.game_id)
+        x, y = self.series.setdefault(point.kind, (array('d'), array('d')))
+        if not x or point.started >= x[-1]:
+            x.append(point.started)
+            y.append(point.rating)
+        else:
+            index = bisect.bisect(x, point.started)
+            x.insert(index, point.started)
+            y.insert(index, point.rating)
+        return True
+
+
+def load_rating_history(profile_id: int) -> RatingHistory:
+    """ Builds rating history from all stored games. Meant to run in a worker."""
+    history = RatingHistory()
+    for game_id, started_at, kind, rating, rating_diff in match_store.get_ratings(
+            profile_id):
+        if kind:
+            history.add(
+                RatingPoint(game_id, parse_started(started_at), kind,
+                            rating_after(rating, rating_diff)))
+    return history
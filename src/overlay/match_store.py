@@ -0,0 +1,184 @@
+"""
+Local SQLite store of match history
+
+Games are stored per profile as returned by aoe4world together with a few
+indexed columns. Match history syncs only need to download games newer
+than the newest game from the last completed sync.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from overlay.logging_func import CONFIG_FOLDER, get_logger
+
+logger = get_logger(__name__)
+MATCH_DB_FILE = os.path.join(CONFIG_FOLDER, "matches.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    profile_id INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    started_at TEXT NOT NULL,
+    kind TEXT,
+    map TEXT,
+    civ TEXT,
+    result TEXT,
+    rating INTEGER,
+    rating_diff INTEGER,
+    data TEXT NOT NULL,
+    opponent_civs TEXT,
+    opponent_rating INTEGER,
+    PRIMARY KEY (profile_id, game_id)
+);
+CREATE INDEX IF NOT EXISTS matches_started ON matches (profile_id, started_at);
+CREATE INDEX IF NOT EXISTS matches_civ ON matches (profile_id, civ);
+CREATE INDEX IF NOT EXISTS matches_map ON matches (profile_id, map);
+CREATE INDEX IF NOT EXISTS matches_kind ON matches (profile_id, kind);
+CREATE TABLE IF NOT EXISTS sync (
+    profile_id INTEGER PRIMARY KEY,
+    newest_game_id INTEGER NOT NULL
+);
+"""
+
+
+def main_player(match: Dict[str, Any],
+                profile_id: Optional[int]) -> Dict[str, Any]:
+    """ Returns player data of the main player (empty if not found)"""
+    for team in match.get('teams', []):
+        for player in team:
+            if player['player']['profile_id'] == profile_id:
+                return player['player']
+    return {}
+
+
+def opponents(match: Dict[str, Any],
+              profile_id: Optional[int]) -> List[Dict[str, Any]]:
+    """ Returns player data of players not in the main player's team"""
+    result = []
+    for team in match.get('teams', []):
+        players = [player['player'] for player in team]
+        if all(player['profile_id'] != profile_id for player in players):
+            result.extend(players)
+    return result
+
+
+def opponent_columns(match: Dict[str, Any],
+                     profile_id: Optional[int]) -> Tuple[str, Optional[int]]:
+    """ Returns opponent civilizations (comma separated) and their average rating"""
+    players = opponents(match, profile_id)
+    civs = ",".join(player.get('civilization') or "" for player in players)
+    ratings = [
+        player['rating'] for player in players
+        if player.get('rating') is not None
+    ]
+    return civs, round(sum(ratings) / len(ratings)) if ratings else None
+
+
+class MatchStore:
+    """ Match history stored in a SQLite database. Can be used from any thread."""
+
+    def __init__(self, path: str = MATCH_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path,
+                                               check_same_thread=False)
+            self._connection.executescript(SCHEMA)
+            self._migrate()
+        return self._connection
+
+    def _migrate(self):
+        """ Adds opponent columns to databases created without them"""
+        columns = {
+            row[1]
+            for row in self._connection.execute("PRAGMA table_info(matches)")
+        }
+        if "opponent_civs" in columns:
+            return
+        logger.info("Adding opponent columns to the match database")
+        with self._connection:
+            self._connection.execute(
+                "ALTER TABLE matches ADD COLUMN opponent_civs TEXT")
+            self._connection.execute(
+                "ALTER TABLE matches ADD COLUMN opponent_rating INTEGER")
+            rows = self._connection.execute(
+                "SELECT profile_id, game_id, data FROM matches").fetchall()
+            self._connection.executemany(
+                "UPDATE matches SET opponent_civs = ?, opponent_rating = ? "
+                "WHERE profile_id = ? AND game_id = ?",
+                [(*opponent_columns(json.loads(data), profile_id), profile_id,
+                  game_id) for profile_id, game_id, data in rows])
+
+    def add_games(self, profile_id: int, games: Iterable[Dict[str, Any]]):
+        """ Adds finished games. Already stored games are replaced."""
+        rows = []
+        for game in games:
+            if game.get('ongoing'):
+                continue
+            player = main_player(game, profile_id)
+            rows.append(
+                (profile_id, game['game_id'], game['started_at'],
+                 game.get('kind'), game.get('map'), player.get('civilization'),
+                 player.get('result'), player.get('rating'),
+                 player.get('rating_diff'), json.dumps(game),
+                 *opponent_columns(game, profile_id)))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                rows)
+
+    def get_games(self,
+                  profile_id: int,
+                  limit: int = -1) -> List[Dict[str, Any]]:
+        """ Returns stored games (newest first)"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM matches WHERE profile_id = ? "
+                "ORDER BY started_at DESC, game_id DESC LIMIT ?",
+                (profile_id, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_columns(self, profile_id: int) -> List[Tuple[Any, ...]]:
+        """ Returns indexed columns of stored games without parsing game data
+        (game_id, started_at, kind, map, civ, result, rating, rating_diff,
+        opponent_civs, opponent_rating) ordered by start"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT game_id, started_at, kind, map, civ, result, rating, "
+                "rating_diff, opponent_civs, opponent_rating FROM matches "
+                "WHERE profile_id = ? ORDER BY started_at, game_id",
+                (profile_id, )).fetchall()
+
+    def get_ratings(self, profile_id: int) -> List[Tuple[Any, ...]]:
+        """ Returns ratings of stored games with a rating
+        (game_id, started_at, kind, rating, rating_diff) ordered by start"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT game_id, started_at, kind, rating, rating_diff "
+                "FROM matches WHERE profile_id = ? AND rating IS NOT NULL "
+                "ORDER BY started_at, game_id", (profile_id, )).fetchall()
+
+    def synced_game_id(self, profile_id: int) -> Optional[int]:
+        """ Returns the newest game id of the last completed sync"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT newest_game_id FROM sync WHERE profile_id = ?",
+                (profile_id, )).fetchone()
+        return row[0] if row else None
+
+    def set_synced_game_id(self, profile_id: int, game_id: int):
+        """ Saves the newest game id of a completed sync"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync VALUES (?,?)",
+                (profile_id, game_id))
+
+
+match_store = MatchStore()
@@ -1,35 +1,78 @@
-from typing import Any, Dict
+import os
+from typing import Any, Dict, Optional, Tuple
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from overlay.aoe4_data import civ_data
 from overlay.custom_widgets import OverlayWidget, VerticalLabel
 from overlay.helper_func import file_path, zeroed
+from overlay.pixmap_cache import PixmapKey, pixmap_cache
 from overlay.settings import settings
 
-PIXMAP_CACHE = {}
+FLAG_SIZE = (60, 30)
+COUNTRY_FLAG_SIZE = (25, 14)
+NAME_STYLE_CACHE: Dict[Tuple[float, ...], str] = {}
+
+
+def name_style(color: Tuple[float, ...]) -> str:
+    """ Returns player name stylesheet for a team color. Handles caching."""
+    if color not in NAME_STYLE_CACHE:
+        NAME_STYLE_CACHE[color] = ("font-weight: bold; "
+                                   "background: QLinearGradient("
+                                   "x1: 0, y1: 0,"
+                                   "x2: 1, y2: 0,"
+                                   f"stop: 0 rgba{color},"
+                                   f"stop: 0.8 rgba{color},"
+                                   "stop: 1 rgba(0,0,0,0))")
+    return NAME_STYLE_CACHE[color]
+
+
+def set_text(widget: QtWidgets.QWidget, text: str):
+    """ Sets widget text only when it changed"""
+    if widget.text() != text:
+        widget.setText(text)
+
+
+def set_visible(widget: QtWidgets.QWidget, visible: bool):
+    """ Shows or hides a widget only when it changes"""
+    if widget.isHidden() == visible:
+        widget.setVisible(visible)
+
+
+def civ_flag_key(civ: str, width: int, height: int) -> PixmapKey:
+    return PixmapKey(file_path(f"img/flags/{civ}.webp"), width, height)
+
+
+def country_flag_key(country_code: str, width: int,
+                     height: int) -> PixmapKey:
+    return PixmapKey(file_path(f"img/countries/{country_code}.png"), width,
+                     height, QtCore.Qt.KeepAspectRatio,
+                     QtCore.Qt.SmoothTransformation)
 
 
 def set_pixmap(civ: str, widget: QtWidgets.QWidget):
-    """ Sets civ pixmap to a widget. Handles caching."""
-    if civ in PIXMAP_CACHE:
-        widget.setPixmap(PIXMAP_CACHE[civ])
-        return
-    path = file_path(f"img/flags/{civ}.webp")
-    pixmap = QtGui.QPixmap(path)
-    pixmap = pixmap.scaled(widget.width(), widget.height())
-    PIXMAP_CACHE[civ] = pixmap
-    widget.setPixmap(pixmap)
+    """ Sets civ pixmap to a widget"""
+    widget.setPixmap(
+        pixmap_cache.pixmap(*civ_flag_key(civ, widget.width(), widget.height())))
+
 
 def set_country_flag(country_code: str, widget: QtWidgets.QLabel):
-    """ Sets country flag to a widget. Handles caching."""
-    if country_code in PIXMAP_CACHE:
-        widget.setPixmap(PIXMAP_CACHE[country_code])
-        return
-    path = file_path(f"img/countries/{country_code}.png")  # PNG format
-    pixmap = QtGui.QPixmap(path)
-    pixmap = pixmap.scaled(widget.width(), widget.height(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-    PIXMAP_CACHE[country_code] = pixmap
-    widget.setPixmap(pixmap)
+    """ Sets country flag to a widget"""
+    widget.setPixmap(
+        pixmap_cache.pixmap(*country_flag_key(country_code, widget.width(),
+                                              widget.height())))
+
+
+def preload_flags():
+    """ Decodes civilization and country flags shown on the overlay in a worker,
+    so showing a new game doesn't wait for the disk"""
+    keys = [civ_flag_key(civ, *FLAG_SIZE) for civ in civ_data.values()]
+    countries = file_path("img/countries")
+    if os.path.isdir(countries):
+        keys.extend(
+            country_flag_key(os.path.splitext(file)[0], *COUNTRY_FLAG_SIZE)
+            for file in sorted(os.listdir(countries)) if file.endswith(".png"))
+    pixmap_cache.preload(keys)
 
 
 class PlayerWidget:
@@ -39,6 +82,8 @@ class PlayerWidget:
         self.hiding_civ_stats: bool = True
         self.team: int = 0
         self.civ: str = ""
+        self.country_code: Optional[str] = None
+        self.name_style: Optional[str] = None
         self.visible = True
         self.create_widgets()
         self.name.setStyleSheet("font-weight: bold")
@@ -64,9 +109,9 @@ class PlayerWidget:
     def create_widgets(self):
         # Separated so this can be changed in a child inner overlay for editing
         self.flag = QtWidgets.QLabel()
-        self.flag.setFixedSize(QtCore.QSize(60, 30))
+        self.flag.setFixedSize(QtCore.QSize(*FLAG_SIZE))
         self.country = QtWidgets.QLabel()
-        self.country.setFixedSize(QtCore.QSize(25,14))
+        self.country.setFixedSize(QtCore.QSize(*COUNTRY_FLAG_SIZE))
         self.country.setScaledContents(True)  
 
         self.name = QtWidgets.QLabel()
@@ -91,14 +136,11 @@ class PlayerWidget:
     def update_name_color(self):
         color = settings.team_colors[(self.team - 1) %
                                      len(settings.team_colors)]
-        color = tuple(color)
-        self.name.setStyleSheet("font-weight: bold; "
-                                "background: QLinearGradient("
-                                "x1: 0, y1: 0,"
-                                "x2: 1, y2: 0,"
-                                f"stop: 0 rgba{color},"
-                                f"stop: 0.8 rgba{color},"
-                                "stop: 1 rgba(0,0,0,0))")
+        style = name_style(tuple(color))
+        # Applying a stylesheet is expensive, skip it when nothing changed
+        if style != self.name_style:
+            self.name_style = style
+            self.name.setStyleSheet(style)
 
     def update_flag(self, ):
         set_pixmap(self.civ, self.flag)
@@ -107,39 +149,49 @@ class PlayerWidget:
         set_country_flag(country_code, self.country)
 
     def update_player(self, player_data: Dict[str, Any]):
+        """ Updates widgets with new player data. Only widgets
+        with changed values are touched."""
         # Flag
-        self.civ = player_data['civ']
-        self.update_flag()
+        if player_data['civ'] != self.civ:
+            self.civ = player_data['civ']
+            self.update_flag()
+
+        country = player_data.get('country', "")
+        if country != self.country_code:
+            self.country_code = country
+            self.update_country_flag(country)
 
-        self.update_country_flag(player_data['country']) 
         # Indicate team with background color
         self.team = zeroed(player_data['team'])
         self.update_name_color()
 
         # Fill the rest
-        self.name.setText(player_data['name'])
-        self.rating.setText(player_data['rating'])
-        self.rank.setText(player_data['rank'])
-        self.winrate.setText(player_data['winrate'])
-        self.wins.setText(str(player_data['wins']))
-        self.losses.setText(player_data['losses'])
-        self.civ_games.setText(player_data['civ_games'])
-        self.civ_winrate.setText(player_data['civ_winrate'])
-        self.civ_median_wins.setText(player_data['civ_win_length_median'])
-        self.show(show=bool(player_data['name']))
+        set_text(self.name, player_data['name'])
+        set_text(self.rating, player_data['rating'])
+        set_text(self.rank, player_data['rank'])
+        set_text(self.winrate, player_data['winrate'])
+        set_text(self.wins, str(player_data['wins']))
+        set_text(self.losses, player_data['losses'])
+        set_text(self.civ_games, player_data['civ_games'])
+        set_text(self.civ_winrate, player_data['civ_winrate'])
+        set_text(self.civ_median_wins, player_data['civ_win_length_median'])
+        visible = bool(player_data['name'])
+        if visible != self.visible:
+            self.show(visible)
 
         # Hide civ specific data when there are none
-        if not player_data['civ_games'] and self.hiding_civ_stats:
-            for widget in (self.civ_games, self.civ_winrate,
-                           self.civ_median_wins):
-                widget.hide()
+        show_civ_stats = visible and (bool(player_data['civ_games'])
+                                      or not self.hiding_civ_stats)
+        for widget in (self.civ_games, self.civ_winrate,
+                       self.civ_median_wins):
+            set_visible(widget, show_civ_stats)
 
     def get_data(self) -> Dict[str, Any]:
         return {
             'civ': self.civ,
             'name': self.name.text(),
             'team': self.team,
-            'country': self.country.text(),
+            'country': self.country_code or "",
             'rating': self.rating.text(),
             'rank': self.rank.text(),
             'wins': self.wins.text(),
@@ -194,6 +246,11 @@ class AoEOverlay(OverlayWidget):
             "font-weight: bold; font-style: italic; color: #f2ea54")
         self.map.setAlignment(QtCore.Qt.AlignCenter)
         self.playerlayout.addWidget(self.map, 0, 0, 1, 2)
+        # Record of recent games
+        self.recent = QtWidgets.QLabel()
+        self.recent.setStyleSheet("font-style: italic; color: #f2ea54")
+        self.recent.setAlignment(QtCore.Qt.AlignCenter)
+        self.playerlayout.addWidget(self.recent, 9, 0, 1, 2)
         # Header
         country = QtWidgets.QLabel("Country")
         rating = QtWidgets.QLabel("Elo")
@@ -251,30 +308,36 @@ class AoEOverlay(OverlayWidget):
             self.show()
 
     def update_data(self, game_data: Dict[str, Any]):
-        self.map.setText(game_data['map'])
-        [p.show(False) for p in self.players]
+        """ Updates the overlay with new game data. Only widgets
+        with changed values are touched, so unchanged data is cheap."""
+        set_text(self.map, game_data['map'])
+        self.update_recent(game_data.get('recent', ""))
 
         show_civ_stats = False
-        for i, player in enumerate(game_data['players']):
-            if i >= len(self.players):
-                break
+        for i, player in enumerate(self.players):
+            if i >= len(game_data['players']):
+                if player.visible:
+                    player.show(False)
+                continue
 
-            self.players[i].update_player(player)
+            player.update_player(game_data['players'][i])
 
-            if player['civ_games']:
+            if game_data['players'][i]['civ_games']:
                 show_civ_stats = True
 
         # Show or hide civilization stats
         for widget in (self.civ_games, self.civ_winrate, self.civ_med_wins,
                        self.civ_stats_label):
-            if self.hiding_civ_stats and not show_civ_stats:
-                widget.hide()
-            else:
-                widget.show()
+            set_visible(widget, not self.hiding_civ_stats or show_civ_stats)
 
         if settings.open_overlay_on_new_game:
             self.show()
 
+    def update_recent(self, recent: str):
+        """ Updates only the record of recent games"""
+        set_text(self.recent, recent)
+        set_visible(self.recent, bool(recent))
+
     def save_geometry(self):
         """ Saves overlay geometry into settings"""
         pos = self.pos()
@@ -284,7 +347,11 @@ class AoEOverlay(OverlayWidget):
         ]
 
     def get_data(self) -> Dict[str, Any]:
-        result = {"map": self.map.text(), "players": []}
+        result = {
+            "map": self.map.text(),
+            "recent": self.recent.text(),
+            "players": []
+        }
         for player in self.players:
             if player.visible:
                 result["players"].append(player.get_data())
@@ -0,0 +1,153 @@
+"""
+Shared cache of scaled images
+
+Pixmaps are cached by file path, size and scaling modes. The least recently
+used ones are dropped when the cache gets over its memory budget
+(`pixmap_cache_size` in settings). Images can be decoded and scaled in a
+worker beforehand, so showing them later doesn't touch the disk.
+"""
+
+from collections import OrderedDict, defaultdict
+from typing import DefaultDict, Dict, Iterable, List, NamedTuple, Union
+
+from PyQt5 import QtCore, QtGui
+
+from overlay.logging_func import get_logger
+from overlay.settings import settings
+from overlay.worker import scheldule
+
+logger = get_logger(__name__)
+
+
+class PixmapKey(NamedTuple):
+    """ Identifies a cached pixmap. Zero width (height) scales the image
+    to the height (width) and keeps its aspect ratio."""
+    path: str
+    width: int
+    height: int
+    aspect: QtCore.Qt.AspectRatioMode = QtCore.Qt.IgnoreAspectRatio
+    transformation: QtCore.Qt.TransformationMode = QtCore.Qt.FastTransformation
+
+
+def scale_image(image: Union[QtGui.QImage, QtGui.QPixmap],
+                key: PixmapKey) -> Union[QtGui.QImage, QtGui.QPixmap]:
+    """ Scales an image (or a pixmap) for a cache key"""
+    if image.isNull():
+        return image
+    if key.width <= 0:
+        return image.scaledToHeight(key.height, key.transformation)
+    if key.height <= 0:
+        return image.scaledToWidth(key.width, key.transformation)
+    return image.scaled(key.width, key.height, key.aspect, key.transformation)
+
+
+def decode_images(keys: List[PixmapKey]) -> Dict[PixmapKey, QtGui.QImage]:
+    """ Decodes and scales images, each file is read once. Meant to run in a worker
+    (unlike pixmaps, images can be used outside of the GUI thread)."""
+    paths: DefaultDict[str, List[PixmapKey]] = defaultdict(list)
+    for key in keys:
+        paths[key.path].append(key)
+    result = dict()
+    for path, path_keys in paths.items():
+        image = QtGui.QImage(path)
+        if image.isNull():
+            logger.warning(f"Failed to load image: {path}")
+            continue
+        for key in path_keys:
+            result[key] = scale_image(image, key)
+    return result
+
+
+def pixmap_bytes(pixmap: QtGui.QPixmap) -> int:
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class PixmapCache:
+    """ LRU cache of scaled pixmaps with a memory budget"""
+
+    def __init__(self):
+        self.pixmaps: "OrderedDict[PixmapKey, QtGui.QPixmap]" = OrderedDict()
+        self.size = 0  # Bytes used by cached pixmaps
+
+    def clear(self):
+        self.pixmaps.clear()
+        self.size = 0
+
+    def pixmap(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        aspect: QtCore.Qt.AspectRatioMode = QtCore.Qt.IgnoreAspectRatio,
+        transformation: QtCore.Qt.TransformationMode = QtCore.Qt.
+        FastTransformation
+    ) -> QtGui.QPixmap:
+        """ Returns a pixmap from `path` scaled to `width` and `height`
+        (see `PixmapKey`)"""
+        key = PixmapKey(path, width, height, aspect, transformation)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+
+        # Scaled pixmaps of other keys aren't reused, scaling them again
+        # would lose quality and ignore the transformation mode of `key`
+        pixmap = QtGui.QPixmap.fromImage(scale_image(QtGui.QImage(path), key))
+        self._store(key, pixmap)
+        return pixmap
+
+    def _store(self, key: PixmapKey, pixmap: QtGui.QPixmap):
+        if key in self.pixmaps:
+            return
+        self.pixmaps[key] = pixmap
+        self.size += pixmap_bytes(pixmap)
+
+        # Remove the least recently used pixmaps over the budget
+        budget = settings.pixmap_cache_size * 2**20
+        while self.size > budget and len(self.pixmaps) > 1:
+            _, old_pixmap = self.pixmaps.popitem(last=False)
+            self.size -= pixmap_bytes(old_pixmap)
+
+    def preload(self, keys: Iterable[PixmapKey]):
+        """ Decodes and scales images in a worker and adds them to the cache"""
+        keys = [key for key in keys if key not in self.pixmaps]
+        if keys:
+            scheldule(self._preloaded, decode_images, keys)
+
+    def _preloaded(self, images: Dict[PixmapKey, QtGui.QImage]):
+        for key, image in images.items():
+            self._store(key, QtGui.QPixmap.fromImage(image))
+        logger.info(f"Preloaded {len(images)} images "
+                    f"(cache: {self.size / 2**20:.1f} MB)")
+
+    def icon(self, path: str) -> QtGui.QIcon:
+        """ Returns an icon that gets pixmaps of the requested size from the cache"""
+        return QtGui.QIcon(PixmapIconEngine(path))
+
+
+class PixmapIconEngine(QtGui.QIconEngine):
+    """ Icon engine drawing pixmaps from the shared cache. Files are loaded
+    only when the icon is shown and in the size it's shown in."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def pixmap(self, size: QtCore.QSize, mode: QtGui.QIcon.Mode,
+               state: QtGui.QIcon.State) -> QtGui.QPixmap:
+        return pixmap_cache.pixmap(self.path, size.width(), size.height(),
+                                   QtCore.Qt.KeepAspectRatio,
+                                   QtCore.Qt.SmoothTransformation)
+
+    def paint(self, painter: QtGui.QPainter, rect: QtCore.QRect,
+              mode: QtGui.QIcon.Mode, state: QtGui.QIcon.State):
+        pixmap = self.pixmap(rect.size(), mode, state)
+        painter.drawPixmap(rect.x() + (rect.width() - pixmap.width()) // 2,
+                           rect.y() + (rect.height() - pixmap.height()) // 2,
+                           pixmap)
+
+    def clone(self) -> QtGui.QIconEngine:
+        return PixmapIconEngine(self.path)
+
+
+pixmap_cache = PixmapCache()
@@ -12,6 +12,9 @@ class _Settings:
 
     def __init__(self):
         self.websocket_port: int = 7307
+        self.websocket_queue_size: int = 16  # max queued messages per client
+        self.websocket_slow_client_policy: str = "drop"  # "drop" or "disconnect"
+        self.websocket_max_timeouts: int = 3  # timeouts in a row before applying the policy
         self.send_email_logs: bool = True
         self.log_matches: bool = True
         self.interval: int = 15
@@ -24,7 +27,9 @@ class _Settings:
         self.overlay_geometry: Optional[List[int]] = None
         self.font_size: int = 12
         self.max_games_history: int = 100
+        self.overlay_recent_games: int = 0  # show the record of the last N games on the overlay (0 to hide)
         self.civ_stats_color: str = "#BC8AEA"
+        self.pixmap_cache_size: int = 64  # memory budget of cached images (MB)
         self.open_overlay_on_new_game = True
         self.show_graph = {"1": True, "2": True, "3": True, "4": True}
         self.team_colors = ((74, 255, 2, 0.35), (3, 179, 255, 0.35),
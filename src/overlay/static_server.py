@@ -0,0 +1,114 @@
+"""
+Serves files from `html` and `img` folders over HTTP on the websocket port
+
+Browser sources can load the overlay from http://localhost:<port>/html/overlay.html
+and reuse cached assets across scene switches.
+"""
+
+import gzip
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from websockets.datastructures import Headers
+
+from overlay.helper_func import file_path
+from overlay.logging_func import get_logger
+
+logger = get_logger(__name__)
+
+SERVED_FOLDERS = ("html", "img")
+INDEX = "/html/overlay.html"
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".json": "application/json",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+    ".ico": "image/x-icon",
+}
+COMPRESSED_TYPES = {".html", ".js", ".css", ".json"}
+
+# Html/js/css can be edited by the user (custom.js/css), so always revalidate them.
+# Images change only with an app update.
+CACHE_CONTROL_TEXT = "no-cache"
+CACHE_CONTROL_IMAGE = "public, max-age=604800"
+
+# Gzipped file contents {path: (etag, compressed data)}
+GZIP_CACHE: Dict[str, Tuple[str, bytes]] = {}
+
+Response = Tuple[HTTPStatus, Headers, bytes]
+
+
+def resolve_path(url_path: str) -> Optional[str]:
+    """ Returns the file path for `url_path` if it's inside one of the served folders"""
+    parts = unquote(urlsplit(url_path).path).strip("/").split("/")
+    if len(parts) < 2 or parts[0] not in SERVED_FOLDERS:
+        return None
+    root = file_path(parts[0])
+    path = os.path.normpath(os.path.join(root, *parts[1:]))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def not_modified(request_headers: Headers, etag: str, mtime: float) -> bool:
+    """ Checks conditional request headers against file validators"""
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match is not None:
+        return etag in (i.strip() for i in if_none_match.split(","))
+
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def serve_file(url_path: str, request_headers: Headers) -> Response:
+    """ Returns HTTP response for a GET request of `url_path`"""
+    if urlsplit(url_path).path in ("", "/"):
+        return HTTPStatus.FOUND, Headers(Location=INDEX), b""
+
+    path = resolve_path(url_path)
+    if path is None:
+        return HTTPStatus.NOT_FOUND, Headers(), b"Not found"
+
+    extension = os.path.splitext(path)[1].lower()
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    headers = Headers()
+    headers["ETag"] = etag
+    headers["Last-Modified"] = formatdate(stat.st_mtime, usegmt=True)
+    headers["Content-Type"] = CONTENT_TYPES.get(extension,
+                                                "application/octet-stream")
+    compress = extension in COMPRESSED_TYPES
+    if compress:
+        headers["Cache-Control"] = CACHE_CONTROL_TEXT
+        headers["Vary"] = "Accept-Encoding"
+    else:
+        headers["Cache-Control"] = CACHE_CONTROL_IMAGE
+
+    if not_modified(request_headers, etag, stat.st_mtime):
+        return HTTPStatus.NOT_MODIFIED, headers, b""
+
+    if compress and "gzip" in request_headers.get("Accept-Encoding", ""):
+        cached = GZIP_CACHE.get(path)
+        if cached is None or cached[0] != etag:
+            with open(path, "rb") as f:
+                cached = (etag, gzip.compress(f.read()))
+            GZIP_CACHE[path] = cached
+        headers["Content-Encoding"] = "gzip"
+        return HTTPStatus.OK, headers, cached[1]
+
+    with open(path, "rb") as f:
+        return HTTPStatus.OK, headers, f.read()
@@ -1,8 +1,10 @@
+import bisect
+import webbrowser
 from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, NamedTuple, Set
 
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 from overlay.logging_func import catch_exceptions, get_logger
 from overlay.settings import settings
@@ -10,181 +12,207 @@ from overlay.settings import settings
 logger = get_logger(__name__)
 
 
-class Line(QtWidgets.QFrame):
+class MatchRow(NamedTuple):
+    """ Compact data for one row of the match history table"""
+    game_id: int
+    team1: str
+    team2: str
+    map_name: str
+    started: str
+    mode: str
+    result: str
+    rating_diff: str
+    link: str
+
+
+def create_match_row(match_data: Dict[str, Any]) -> MatchRow:
+    """ Extracts strings shown in the table from aoe4world match data"""
+    # Try to find the main player team first
+    main_player_data = None
+    main_team = 0
+    for team_idx, team in enumerate(match_data['teams']):
+        for player in team:
+            if player['player']['profile_id'] == settings.profile_id:
+                main_team = team_idx
+                main_player_data = player['player']
+                break
+
+    # Teams
+    teams = defaultdict(list)
+    for team_idx, team in enumerate(match_data['teams']):
+        for player in team:
+            civ = player['player']['civilization'].replace("_",
+                                                           " ").capitalize()
+            teams[team_idx].append(f"{player['player']['name']} ({civ})")
+    other_team = 1 if main_team == 0 else 0
+
+    # Date
+    started = datetime.strptime(match_data['started_at'],
+                                "%Y-%m-%dT%H:%M:%S.000Z")
+
+    # Result
+    result = main_player_data['result'].capitalize(
+    ) if main_player_data and main_player_data['result'] else "?"
+
+    # ELO change
+    diff = main_player_data['rating_diff'] if main_player_data and main_player_data[
+        'rating_diff'] else "?"
+
+    game_id = match_data["game_id"]
+    return MatchRow(
+        game_id, "\n".join(teams[main_team]), "\n".join(teams[other_team]),
+        match_data.get('map', "Unknown map"),
+        started.strftime("%b %d, %H:%M:%S"), match_data['kind'], result,
+        str(diff),
+        f"https://aoe4world.com/players/{settings.profile_id}/games/{game_id}")
+
+
+class MatchHistoryModel(QtCore.QAbstractTableModel):
+    """ Table model with match history. Newest games first."""
+    HEADERS = ("Team 1", "Team 2", "Map", "Started", "Mode", "Result",
+               "Rating diff", "AoE4World")
+    TEAM_COLUMNS = {0, 1}
+    LINK_COLUMN = 7
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("background-color: #bbb")
-        self.setMinimumHeight(1)
-        self.setMaximumHeight(1)
-
-
-class MatchEntry:
-
-    def __init__(self, layout: QtWidgets.QGridLayout, match_data: Dict[str,
-                                                                       Any]):
-        self.main_layout: QtWidgets.QGridLayout = layout
-        self.in_layout: bool = False
-        self.game_id = match_data['game_id']
-
-        # Try to find the main player team first
-        main_player_data = None
-        main_team = 0
-        for team_idx, team in enumerate(match_data['teams']):
-            for player in team:
-                if player['player']['profile_id'] == settings.profile_id:
-                    main_team = team_idx
-                    main_player_data = player['player']
-                    break
-
-        # Teams
-        teams = defaultdict(list)
-        for team_idx, team in enumerate(match_data['teams']):
-            for player in team:
-                civ = player['player']['civilization'].replace(
-                    "_", " ").capitalize()
-                teams[team_idx].append(
-                    f"{player['player']['name']} ({civ})   ")
-
-        other_team = 1 if main_team == 0 else 0
-        team_widgets = []
-        for team in (main_team, other_team):
-            team_string = "\n".join(teams[team])
-            team_widgets.append(QtWidgets.QLabel(team_string))
-
-        # Map
-        map_name = QtWidgets.QLabel(match_data.get('map', "Unknown map"))
-
-        # Date
-        started = datetime.strptime(match_data['started_at'],
-                                    "%Y-%m-%dT%H:%M:%S.000Z")
-
-        date = QtWidgets.QLabel(started.strftime("%b %d, %H:%M:%S"))
-
-        # Mode
-        mode = QtWidgets.QLabel(match_data['kind'])
-
-        # Result
-        result = QtWidgets.QLabel(main_player_data['result'].capitalize(
-        ) if main_player_data and main_player_data['result'] else "?")
-
-        # ELO change
-        diff = main_player_data[
-            'rating_diff'] if main_player_data and main_player_data[
-                'rating_diff'] else "?"
-        elo_change = QtWidgets.QLabel(str(diff))
-
-        # aoe4world Link
-        game_id = match_data["game_id"]
-        link = QtWidgets.QLabel(
-            f'<a href="https://aoe4world.com/players/{settings.profile_id}/games/{game_id}"> game link</a>'
-        )
-        link.setOpenExternalLinks(True)
-
-        self.widgets = (*team_widgets, map_name, date, mode, result,
-                        elo_change, link)
-
-        for item in self.widgets:
-            if item != link:
-                item.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
-            if item not in team_widgets:
-                item.setAlignment(QtCore.Qt.AlignCenter)
-
-        # Line
-        self.line = Line()
-
-    def add_to_layout(self, row: int):
-        """ Adds widgets back to the layout"""
-        self.in_layout = True
-        for column, widget in enumerate(self.widgets):
-            self.main_layout.addWidget(widget, row, column)
-        self.main_layout.addWidget(self.line, row + 1, 0, 1, len(self.widgets))
-
-    def remove_from_layout(self):
-        """ Removes its widgets from the layout"""
-        self.in_layout = False
-        for widget in self.widgets:
-            self.main_layout.removeWidget(widget)
-        self.main_layout.removeWidget(self.line)
+        self.rows: List[MatchRow] = []
+        # Negative game ids of `rows` (ascending) for finding insert positions
+        self.keys: List[int] = []
+        self.game_ids: Set[int] = set()
+        self.link_font = QtGui.QFont()
+        self.link_font.setUnderline(True)
+        self.link_color = QtGui.QColor("#0645ad")
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role: int):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            if column == self.LINK_COLUMN:
+                return "game link"
+            text = row[column + 1]
+            if column in self.TEAM_COLUMNS:
+                return text.replace("\n", ", ")
+            return text
+        if role == QtCore.Qt.ToolTipRole:
+            return row[column + 1]
+        if role == QtCore.Qt.TextAlignmentRole and column not in self.TEAM_COLUMNS:
+            return QtCore.Qt.AlignCenter
+        if column == self.LINK_COLUMN:
+            if role == QtCore.Qt.ForegroundRole:
+                return self.link_color
+            if role == QtCore.Qt.FontRole:
+                return self.link_font
+        return None
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.keys = []
+        self.game_ids = set()
+        self.endResetModel()
+
+    def _insert_rows(self, position: int, rows: List[MatchRow]):
+        """ Inserts a block of rows (sorted newest first) at `position`"""
+        self.beginInsertRows(QtCore.QModelIndex(), position,
+                             position + len(rows) - 1)
+        self.rows[position:position] = rows
+        self.keys[position:position] = [-row.game_id for row in rows]
+        self.endInsertRows()
+
+    def add_matches(self, matches: List[Dict[str, Any]], limit: int):
+        """ Adds finished matches that aren't present yet and keeps at most `limit` newest"""
+        built: Dict[int, MatchRow] = dict()
+        for match in matches:
+            if (match['ongoing'] or match['game_id'] in self.game_ids
+                    or match['game_id'] in built):
+                continue
+            built[match['game_id']] = create_match_row(match)
+        if not built:
+            return
+        new_rows = sorted(built.values(),
+                          key=lambda row: row.game_id,
+                          reverse=True)
+
+        if not self.rows or new_rows[-1].game_id > self.rows[0].game_id:
+            self._insert_rows(0, new_rows)
+        elif new_rows[0].game_id < self.rows[-1].game_id:
+            self._insert_rows(len(self.rows), new_rows)
+        else:
+            for row in new_rows:
+                self._insert_rows(bisect.bisect_left(self.keys, -row.game_id),
+                                  [row])
+        # Only games with rows are present, others are tried again next time
+        self.game_ids.update(row.game_id for row in new_rows)
+
+        # Remove the oldest games over the limit
+        if len(self.rows) > limit:
+            self.beginRemoveRows(QtCore.QModelIndex(), limit,
+                                 len(self.rows) - 1)
+            for row in self.rows[limit:]:
+                self.game_ids.discard(row.game_id)
+            del self.rows[limit:]
+            del self.keys[limit:]
+            self.endRemoveRows()
 
 
 class MatchHistoryTab(QtWidgets.QWidget):
 
     def __init__(self, parent):
         super().__init__(parent)
-        # List of added matches. New ones at the end.
-        self.matches: List[MatchEntry] = []
-
-        # Scroll content
-        scroll_content = QtWidgets.QWidget()
-        self.scroll_layout = QtWidgets.QGridLayout(self)
-        self.scroll_layout.setContentsMargins(10, 10, 10, 10)
-        self.scroll_layout.setAlignment(QtCore.Qt.AlignTop)
-        scroll_content.setLayout(self.scroll_layout)
-
-        # Scroll area
-        scroll = QtWidgets.QScrollArea()
-        scroll.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
-        scroll.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        scroll.setWidgetResizable(True)
-        scroll.setWidget(scroll_content)
-
-        # Add scroll are to layout
+        self.model = MatchHistoryModel(self)
+
+        # Table view only creates what's visible
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.table.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
+        self.table.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setWordWrap(False)
+        self.table.verticalHeader().hide()
+        self.table.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(
+            self.table.fontMetrics().height() + 12)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        for column in self.model.TEAM_COLUMNS:
+            header.setSectionResizeMode(column,
+                                        QtWidgets.QHeaderView.Interactive)
+            header.resizeSection(column, 220)
+        header.setStyleSheet("QHeaderView::section {font-weight: bold}")
+        self.table.clicked.connect(self.cell_clicked)
+
         layout = QtWidgets.QVBoxLayout(self)
-        layout.addWidget(scroll)
+        layout.addWidget(self.table)
         layout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(layout)
 
-        # Header
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Team 1"), 0, 0)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Team 2"), 0, 1)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Map"), 0, 2)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Started"), 0, 3)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Mode"), 0, 4)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Result"), 0, 5)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("Rating diff"), 0, 6)
-        self.scroll_layout.addWidget(QtWidgets.QLabel("AoE4World"), 0, 7)
-
-        self.header_widgets = set()
-        for i in range(self.scroll_layout.count()):
-            self.scroll_layout.itemAt(i).widget().setAlignment(
-                QtCore.Qt.AlignHCenter)
-            self.scroll_layout.itemAt(i).widget().setStyleSheet(
-                "font-weight: bold")
-            self.header_widgets.add(self.scroll_layout.itemAt(i).widget())
-
-    def clear_scroll_layout(self):
-        """ Removes all widgets from the scroll layout
-        All except the header widgets"""
-        for match in self.matches:
-            match.remove_from_layout()
+    def cell_clicked(self, index: QtCore.QModelIndex):
+        """ Opens aoe4world link for the game"""
+        if index.column() == self.model.LINK_COLUMN:
+            webbrowser.open(self.model.rows[index.row()].link)
 
     def clear_games(self):
         """ Removes all games from the game tab"""
-        self.clear_scroll_layout()
-        self.matches = []
+        self.model.clear()
 
     @catch_exceptions(logger)
     def update_widgets(self, match_history: List[Any]):
-        # Remove widgets from the layout
-        self.clear_scroll_layout()
-
-        # Add new matches to our list
-        present_game_ids = {i.game_id for i in self.matches}
-
-        for match in reversed(match_history):
-            if match['ongoing']:
-                continue
-            if match['game_id'] in present_game_ids:
-                continue
-            self.matches.append(MatchEntry(self.scroll_layout, match))
-
-        # Re-add widgets to the layout
-        added_rows = 1  # With header
-        for match_entry in reversed(self.matches):
-            if match_entry.in_layout:
-                continue
-            if added_rows > settings.max_games_history * 2:
-                continue
-            match_entry.add_to_layout(added_rows)
-            added_rows += 2
+        self.model.add_matches(match_history, settings.max_games_history)
@@ -1,22 +1,37 @@
-from typing import Any, Dict, List
+from functools import partial
+from typing import Any, Dict, List, Optional
 
 from PyQt5 import QtWidgets
 
-from overlay.api_checking import get_rating_history
 from overlay.graph_widget import GraphWidget
-from overlay.logging_func import get_logger
+from overlay.logging_func import catch_exceptions, get_logger
+from overlay.match_stats import (RatingHistory, RatingPoint,
+                                 load_rating_history, rating_point)
 from overlay.settings import settings
 from overlay.worker import scheldule
 
 logger = get_logger(__name__)
 
 
+def kind_label(kind: str) -> str:
+    """ Returns plot label for aoe4world game kind ("rm_1v1" -> "RM 1v1")"""
+    prefix, _, rest = kind.partition("_")
+    return f"{prefix.upper()} {rest}".strip()
+
+
 class GraphTab(QtWidgets.QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         layout = QtWidgets.QVBoxLayout()
         self.setLayout(layout)
         self.plot_visibility: Dict[int, bool] = dict()
+        self.history = RatingHistory()
+        # Plot index for each game kind
+        self.indexes: Dict[str, int] = dict()
+        # Points that arrived while the history was being built
+        self.pending: Optional[List[RatingPoint]] = None
+        # Increased when the history is cleared, so older loads are dropped
+        self.generation = 0
 
         # Graph
         self.graph = GraphWidget()
@@ -26,9 +41,47 @@ class GraphTab(QtWidgets.QWidget):
         self.graph.x_is_timestamp = True
         layout.addWidget(self.graph)
 
-    def run_update(self):
-        """ Gets new data and updates graphs"""
-        scheldule(self.plot_data, self.get_all_rating_history)
+    def load(self, profile_id: int):
+        """ Builds rating history from stored games in a worker"""
+        self.generation += 1
+        self.pending = []
+        scheldule(partial(self.loaded, generation=self.generation),
+                  load_rating_history, profile_id)
+
+    def loaded(self, history: RatingHistory, generation: int):
+        if generation != self.generation:
+            return  # Rating history of the previous profile
+        for point in self.pending or ():
+            history.add(point)
+        self.pending = None
+        self.history = history
+        self.plot_data()
+
+    def clear_match_data(self):
+        self.generation += 1
+        self.pending = None
+        self.history = RatingHistory()
+        self.plot_data()
+
+    @catch_exceptions(logger)
+    def add_games(self, match_history: List[Any]):
+        """ Appends ratings of new finished games to the graph"""
+        added = False
+        for match in match_history:
+            point = rating_point(match, settings.profile_id)
+            if point is None:
+                continue
+            if self.pending is not None:
+                self.pending.append(point)
+            elif self.history.add(point):
+                added = True
+                if point.kind in self.indexes:
+                    self.graph.append(self.indexes[point.kind],
+                                      (point.started, ), (point.rating, ))
+                else:
+                    self.plot_kind(point.kind)
+        if added:
+            self.graph.update()
 
     def change_plot_visibility(self, index: int, action: QtWidgets.QAction):
         """ Updates plot visibility for given `index`"""
@@ -42,31 +95,20 @@ class GraphTab(QtWidgets.QWidget):
         self.graph.max_x_diff = 24 * 60 * 60 if action.isChecked() else -1
         self.graph.update()
 
-    @staticmethod
-    def get_all_rating_history() -> Dict[int, List[Any]]:
-        """ Gets rating history for all game modes"""
-        result = dict()
-        for id in range(17, 21):
-            result[id] = get_rating_history(id, amount=150)
-        return result
-
-    def plot_data(self, data: Dict[int, List[Any]]):
-        if data is None:
-            logger.warning("No graph data")
-            return
+    def plot_kind(self, kind: str):
+        """ Adds a plot for rating history of a game kind"""
+        index = self.indexes.setdefault(kind, len(self.indexes) + 1)
+        x, y = self.history.series[kind]
+        self.graph.plot(x,
+                        y,
+                        label=kind_label(kind),
+                        index=index,
+                        show=self.plot_visibility.get(index, True))
+
+    def plot_data(self):
         self.graph.title = f"Rating history ({settings.player_name})"
         self.graph.clear_data()
-        for id, values in data.items():
-            if not values:
-                continue
-            index = id - 16
-            label = f"{index}v{index}"
-            y = [i['rating'] for i in values]
-            x = [i['timestamp'] for i in values]
-            self.graph.plot(x,
-                            y,
-                            label=label,
-                            index=index,
-                            show=self.plot_visibility.get(index, True))
-
+        self.indexes = dict()
+        for kind in sorted(self.history.series):
+            self.plot_kind(kind)
         self.graph.update()
@@ -1,5 +1,6 @@
 import importlib
 import platform
+import threading
 import time
 import webbrowser
 from functools import partial
@@ -9,12 +10,15 @@ import keyboard
 from PyQt5 import QtWidgets
 
 import overlay.helper_func as hf
-from overlay.api_checking import Api_checker, get_full_match_history
+from overlay.api_checking import Api_checker, MatchHistorySync
 from overlay.logging_func import get_logger, log_match
+from overlay.match_store import match_store
+from overlay.overlay_widget import preload_flags
 from overlay.settings import settings
 from overlay.tab_build_orders import BoTab
 from overlay.tab_games import MatchHistoryTab
 from overlay.tab_graphs import GraphTab
+from overlay.tab_matchups import MatchupTab
 from overlay.tab_override import OverrideTab
 from overlay.tab_random import RandomTab
 from overlay.tab_settings import SettingsTab
@@ -31,14 +35,23 @@ class TabWidget(QtWidgets.QTabWidget):
         super().__init__(parent)
         self.version = version
         self.api_checker = Api_checker()
-        self.websocket_manager = Websocket_manager(settings.websocket_port)
-        self.force_stop: bool = False
+        self.match_history = MatchHistorySync()
+        self.websocket_manager = Websocket_manager(
+            settings.websocket_port,
+            queue_size=settings.websocket_queue_size,
+            slow_client_policy=settings.websocket_slow_client_policy,
+            max_timeouts=settings.websocket_max_timeouts)
+        self.force_stop = threading.Event()
         self.prevent_overlay_update: bool = False
+        # Processed data of the last live game
+        self.live_game: Optional[Dict[str, Any]] = None
 
         self.games_tab = MatchHistoryTab(self)
-        # self.graph_tab = GraphTab(self)
+        self.graph_tab = GraphTab(self)
         self.random_tab = RandomTab(self)
-        # self.stats_tab = StatsTab(self)
+        self.stats_tab = StatsTab(self)
+        self.stats_tab.updated.connect(self.update_recent_record)
+        self.matchup_tab = MatchupTab(self)
         self.build_order_tab = BoTab(self)
         self.override_tab = OverrideTab(self)
         self.override_tab.data_override.connect(self.override_event)
@@ -48,8 +61,9 @@ class TabWidget(QtWidgets.QTabWidget):
 
         self.addTab(self.settigns_tab, "Settings")
         self.addTab(self.games_tab, "Games")
-        # self.addTab(self.graph_tab, "Rating")
-        # self.addTab(self.stats_tab, "Stats")
+        self.addTab(self.graph_tab, "Rating")
+        self.addTab(self.stats_tab, "Stats")
+        self.addTab(self.matchup_tab, "Matchups")
         self.addTab(self.build_order_tab, "Build orders")
         self.addTab(self.random_tab, "Randomize")
         self.addTab(self.override_tab, "Override")
@@ -60,6 +74,7 @@ class TabWidget(QtWidgets.QTabWidget):
         )
         self.check_for_new_version()
         hf.create_custom_files()
+        preload_flags()
         self.settigns_tab.start()
         self.run_new_game_check()
         self.websocket_manager.run()
@@ -71,26 +86,61 @@ class TabWidget(QtWidgets.QTabWidget):
         self.build_order_tab.close()
 
     def new_profile_found(self):
+        self.live_game = None
         self.api_checker.reset()
-        # self.graph_tab.run_update()
-        # self.stats_tab.run_mode_update()
-        # self.stats_tab.clear_match_data()
+        self.match_history.reset()
+        self.stats_tab.clear_match_data()
+        self.stats_tab.load(settings.profile_id)
+        self.matchup_tab.clear_match_data()
+        self.matchup_tab.load(settings.profile_id)
+        self.graph_tab.clear_match_data()
+        self.graph_tab.load(settings.profile_id)
         self.games_tab.clear_games()
-        self.update_with_match_history_data(10000)
+        # Show stored games first, then download only the new ones
+        generation = self.match_history.generation
+        scheldule(partial(self.got_stored_games, generation=generation),
+                  match_store.get_games, settings.profile_id,
+                  settings.max_games_history)
+        self.update_with_match_history_data()
         self.parent().update_title(settings.player_name)
 
-    def update_with_match_history_data(self, amount: int):
-        """ Gets match history and updates games tab and passes data to stats tab"""
-        scheldule(self.got_match_history, get_full_match_history, amount)
+    def update_with_match_history_data(self, amount: int = 10000):
+        """ Syncs match history page by page. Each page updates games tab
+        and is passed to stats tab as soon as it's downloaded."""
+        generation = self.match_history.generation
+        scheldule(partial(self.got_match_history, generation=generation),
+                  self.match_history.sync,
+                  amount,
+                  generation,
+                  progress_callback=partial(self.got_match_history_page,
+                                            generation=generation))
 
-    def got_match_history(self, match_history: List[Any]):
-        if match_history is None:
+    def got_stored_games(self, match_history: List[Any], generation: int):
+        """ Shows stored games. Other tabs load them in workers."""
+        if generation != self.match_history.generation:
+            return  # Games of the previous profile
+        self.games_tab.update_widgets(match_history)
+
+    def got_match_history_page(self, match_history: List[Any],
+                               generation: int):
+        """ Passes newly synced games to all tabs"""
+        if generation != self.match_history.generation:
+            return  # Games of the previous profile
+        self.settigns_tab.message("")
+        self.stats_tab.update_other_stats(match_history)
+        self.matchup_tab.add_games(match_history)
+        self.graph_tab.add_games(match_history)
+        self.games_tab.update_widgets(match_history)
+
+    def got_match_history(self, new_games: Optional[int], generation: int):
+        if generation != self.match_history.generation:
+            logger.info("Match history sync for the previous profile ended")
+            return
+        if new_games is None:
             self.settigns_tab.aoe4net_error_msg()
             logger.warning("No match history data")
             return
-        self.settigns_tab.message("")
-        # self.stats_tab.update_other_stats(match_history)
-        self.games_tab.update_widgets(match_history)
+        logger.info(f"Match history synced ({new_games} new games)")
 
     def run_new_game_check(self, delayed_seconds: int = 0):
         """ Creates a new thread for a new api check"""
@@ -99,17 +149,15 @@ class TabWidget(QtWidgets.QTabWidget):
 
     def new_game(self, game_data: Optional[Dict[str, Any]]):
         """Received new data from api check, passes data along and reruns the check"""
-        if self.force_stop:
+        if self.force_stop.is_set():
             return
 
         if game_data is None:
             pass
-        elif "new_rating" in game_data:
-            logger.info(
-                f"Game finished (rating_timestamp: {game_data['timestamp']})")
-            # self.graph_tab.run_update()
-            # self.stats_tab.run_mode_update()
-            self.update_with_match_history_data(2)
+        elif "game_finished" in game_data:
+            logger.info(f"Game finished (game_id: {game_data['game_finished']})")
+            # Synced game updates all tabs and the recent record on the overlay
+            self.update_with_match_history_data()
 
         elif 'server_down' in game_data:
             self.settigns_tab.aoe4net_error_msg()
@@ -117,9 +165,16 @@ class TabWidget(QtWidgets.QTabWidget):
             if settings.log_matches:
                 log_match(game_data)
             processed = hf.process_game(game_data)
+            if settings.overlay_recent_games > 0:
+                processed['recent'] = self.stats_tab.recent_record(
+                    settings.overlay_recent_games)
             logger.info(
                 f"New live game (game_id: {game_data['game_id']} | mode: {game_data['kind']} | started: {game_data['started_at']})"
             )
+            if not game_data.get('ongoing'):
+                # It finished before we could see it ongoing
+                self.update_with_match_history_data()
+            self.live_game = processed
             self.override_tab.update_data(processed)
             if not self.prevent_overlay_update:
                 self.settigns_tab.overlay_widget.update_data(processed)
@@ -128,12 +183,35 @@ class TabWidget(QtWidgets.QTabWidget):
                     "data": processed
                 })
 
-        self.run_new_game_check(delayed_seconds=30)
+        self.run_new_game_check(
+            delayed_seconds=self.api_checker.scheduler.peek_delay())
+
+    def update_recent_record(self):
+        """ Updates the record of recent games shown with the live game
+        (stats change when finished games get synced). Other overlay data
+        and override edits stay as they are."""
+        if self.live_game is None or settings.overlay_recent_games <= 0:
+            return
+        recent = self.stats_tab.recent_record(settings.overlay_recent_games)
+        if recent == self.live_game.get('recent'):
+            return
+        self.live_game = {**self.live_game, 'recent': recent}
+        if self.prevent_overlay_update:
+            return
+        self.settigns_tab.overlay_widget.update_recent(recent)
+        player_data = self.websocket_manager.player_data
+        if player_data is not None:
+            self.websocket_manager.send({
+                "type": "player_data",
+                "data": {
+                    **player_data, 'recent': recent
+                }
+            })
 
     def stop_checking_api(self):
         """ The app is closing, we need to start shuttings things down"""
-        self.force_stop = True
-        self.api_checker.force_stop = True
+        self.force_stop.set()
+        self.api_checker.stop()
 
     def check_for_new_version(self):
         """ Checks for a new version, creates a button if there is one """
@@ -169,15 +247,13 @@ class TabWidget(QtWidgets.QTabWidget):
         interval = 10  # Seconds
         while True:
             start = time.time()
-            # Wait 5s
-            for _ in range(interval * 2):
-                time.sleep(0.5)
-                if self.force_stop:
-                    return None
+            if self.force_stop.wait(interval):
+                return None
             # Check the difference
             diff = time.time() - start
             if diff > interval + 5:
-                time.sleep(4)
+                if self.force_stop.wait(4):
+                    return None
                 return diff - interval
 
     def pc_waken_from_sleep(self, diff: Optional[float]):
@@ -187,6 +263,7 @@ class TabWidget(QtWidgets.QTabWidget):
 
         logger.info(f'PC awoke! ({hf.strtime(diff, show_seconds=True)})')
         self.check_waking()
+        self.api_checker.check_now()
 
         # Check for new updates & reset keyboard threads
         self.check_for_new_version()
@@ -0,0 +1,217 @@
+from functools import partial
+from typing import List, Optional, Tuple
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from overlay.aoe4_data import civ_data, mode_data
+from overlay.logging_func import catch_exceptions, get_logger
+from overlay.match_stats import (GameRecord, MatchupMatrix, game_record,
+                                 load_matchups, wilson_interval)
+from overlay.settings import settings
+from overlay.tab_override import get_icon
+from overlay.worker import scheldule
+
+logger = get_logger(__name__)
+
+LOSS_COLOR = QtGui.QColor(214, 69, 65)
+WIN_COLOR = QtGui.QColor(38, 166, 91)
+EMPTY_COLOR = QtGui.QColor(240, 240, 240)
+FULL_OPACITY_GAMES = 20  # Cells with fewer games are drawn fainter
+
+
+def heatmap_color(wins: int, losses: int) -> QtGui.QColor:
+    """ Returns cell color based on the winrate and the number of games"""
+    games = wins + losses
+    if not games:
+        return EMPTY_COLOR
+    color = WIN_COLOR if wins >= losses else LOSS_COLOR
+    strength = abs(wins / games - 0.5) * 2
+    strength *= 0.3 + 0.7 * min(games, FULL_OPACITY_GAMES) / FULL_OPACITY_GAMES
+    return QtGui.QColor(
+        *(round(255 + (c - 255) * strength)
+          for c in (color.red(), color.green(), color.blue())))
+
+
+class MatchupModel(QtCore.QAbstractTableModel):
+    """ Table model with winrates of my civilizations (rows) against opponent civilizations (columns)"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.civs = list(civ_data.values())
+        self.cells: List[List[Tuple[int, int]]] = [[
+            (0, 0) for _ in self.civs
+        ] for _ in self.civs]
+        # Cells counted only from 1v1 games (each outcome is a separate game)
+        self.independent: List[List[bool]] = [[True for _ in self.civs]
+                                              for _ in self.civs]
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.civs)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.civs)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Vertical:
+            return self.civs[section]
+        if role == QtCore.Qt.DecorationRole:
+            return get_icon(self.civs[section])
+        if role == QtCore.Qt.ToolTipRole:
+            if orientation == QtCore.Qt.Horizontal:
+                return f"Against {self.civs[section]}"
+            return f"Playing {self.civs[section]}"
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role: int):
+        if not index.isValid():
+            return None
+        wins, losses = self.cells[index.row()][index.column()]
+        games = wins + losses
+
+        if role == QtCore.Qt.DisplayRole:
+            return f"{100 * wins / games:.0f}" if games else ""
+        if role == QtCore.Qt.BackgroundRole:
+            return heatmap_color(wins, losses)
+        if role == QtCore.Qt.TextAlignmentRole:
+            return QtCore.Qt.AlignCenter
+        if role == QtCore.Qt.ToolTipRole and games:
+            text = (f"{self.civs[index.row()]} vs {self.civs[index.column()]}"
+                    f"\n{wins}-{losses} ({wins/games:.1%})")
+            if not self.independent[index.row()][index.column()]:
+                # Outcomes against teammates' opponents aren't independent
+                return f"{text}\nTeam games count once for each opponent"
+            low, high = wilson_interval(wins, games)
+            return f"{text}\n95% confidence: {low:.1%} – {high:.1%}"
+        return None
+
+    def set_cells(self, cells: List[List[Tuple[int, int]]],
+                  independent: List[List[bool]]):
+        self.cells = cells
+        self.independent = independent
+        self.dataChanged.emit(
+            self.index(0, 0),
+            self.index(len(self.civs) - 1,
+                       len(self.civs) - 1))
+
+
+class MatchupTab(QtWidgets.QWidget):
+    """ Heatmap of winrates for each civilization matchup"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.matchups = MatchupMatrix()
+        # Games that arrived while the matrix was being built
+        self.pending: Optional[List[GameRecord]] = None
+        # Increased when the matrix is cleared, so older loads are dropped
+        self.generation = 0
+        self.model = MatchupModel(self)
+        self.initUI()
+
+    def initUI(self):
+        main_layout = QtWidgets.QVBoxLayout()
+        main_layout.setContentsMargins(10, 10, 10, 5)
+        self.setLayout(main_layout)
+
+        ### Filtering
+        slayout = QtWidgets.QHBoxLayout()
+        slayout.setAlignment(QtCore.Qt.AlignLeft)
+        slayout.setSpacing(5)
+        main_layout.addLayout(slayout)
+
+        self.games_found = QtWidgets.QLabel("Games analyzed: 0")
+        self.games_found.setMinimumWidth(200)
+        self.games_found.setStyleSheet("QLabel {font-weight: bold}")
+        slayout.addWidget(self.games_found)
+        slayout.addItem(QtWidgets.QSpacerItem(40, 0))
+
+        mode = QtWidgets.QLabel("Filter mode:")
+        mode.setStyleSheet("font-weight: bold")
+        slayout.addWidget(mode)
+
+        self.mode_box = QtWidgets.QComboBox()
+        self.mode_box.setMaximumWidth(200)
+        self.mode_box.setToolTip("Filter data for a mode")
+        slayout.addWidget(self.mode_box)
+        self.mode_box.addItem("All")
+        for mode in mode_data.values():
+            self.mode_box.addItem(mode)
+        self.mode_box.currentIndexChanged.connect(
+            lambda: self.update_heatmap())
+
+        note = QtWidgets.QLabel(
+            "Winrate (%) of your civilizations (rows) against opponent "
+            "civilizations (columns). Hover over a cell for details.")
+        note.setStyleSheet("color: grey")
+        slayout.addItem(QtWidgets.QSpacerItem(20, 0))
+        slayout.addWidget(note)
+
+        ### Heatmap
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.table.setShowGrid(False)
+        self.table.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Stretch)
+        self.table.horizontalHeader().setMinimumSectionSize(36)
+        self.table.setIconSize(QtCore.QSize(32, 18))
+        self.table.setStyleSheet(
+            "QHeaderView::section {font-weight: bold; padding: 2px}")
+        main_layout.addWidget(self.table)
+
+    def load(self, profile_id: int):
+        """ Builds the matchup matrix from stored games in a worker"""
+        self.generation += 1
+        self.pending = []
+        scheldule(partial(self.loaded, generation=self.generation),
+                  load_matchups, profile_id)
+
+    def loaded(self, matchups: MatchupMatrix, generation: int):
+        if generation != self.generation:
+            return  # Matchups of the previous profile
+        for record in self.pending or ():
+            matchups.add(record)
+        self.pending = None
+        self.matchups = matchups
+        self.update_heatmap()
+
+    def clear_match_data(self):
+        self.generation += 1
+        self.pending = None
+        self.matchups = MatchupMatrix()
+        self.update_heatmap()
+
+    @catch_exceptions(logger)
+    def add_games(self, match_history: List):
+        """ Adds new finished games to the matrix"""
+        added = False
+        for match in match_history:
+            record = game_record(match, settings.profile_id)
+            if record is None:
+                continue
+            if self.pending is not None:
+                self.pending.append(record)
+            elif self.matchups.add(record):
+                added = True
+        if added:
+            self.update_heatmap()
+
+    @catch_exceptions(logger)
+    def update_heatmap(self):
+        mode = None
+        if self.mode_box.currentIndex() != 0:
+            mode = self.mode_box.currentIndex() + 16
+        cells = self.matchups.matrix(mode)
+        if mode is None:
+            solo = self.matchups.matrix(17)
+            independent = [[sum(cell) == sum(solo_cell)
+                            for cell, solo_cell in zip(row, solo_row)]
+                           for row, solo_row in zip(cells, solo)]
+        else:
+            independent = [[mode == 17] * len(row) for row in cells]
+        self.model.set_cells(cells, independent)
+        self.games_found.setText(
+            f"Games analyzed: {self.matchups.games(mode)}")
@@ -6,20 +6,15 @@ from overlay.aoe4_data import civ_data
 from overlay.helper_func import file_path, zeroed
 from overlay.logging_func import get_logger
 from overlay.overlay_widget import AoEOverlay, PlayerWidget
+from overlay.pixmap_cache import pixmap_cache
 from overlay.settings import settings
 
 logger = get_logger(__name__)
-ICON_CACHE = {}
 
 
 def get_icon(civ: str) -> QtGui.QIcon:
-    """ Gets icon for a civilization. Handles caching."""
-    if civ in ICON_CACHE:
-        return ICON_CACHE[civ]
-    path = file_path(f"img/flags/{civ}.webp")
-    icon = QtGui.QIcon(path)
-    ICON_CACHE[civ] = icon
-    return icon
+    """ Gets icon for a civilization. Pixmaps come from the shared cache."""
+    return pixmap_cache.icon(file_path(f"img/flags/{civ}.webp"))
 
 
 class InnerPlayer(PlayerWidget):
@@ -100,6 +95,8 @@ class InnerPlayer(PlayerWidget):
     def update_player(self, player_data: Dict[str, Any]):
         # We don't want the automatic update to look like the user made the change
         self.disconnect_changes()
+        # The civilization could have been changed by the user
+        self.civ = self.flag.currentText()
         super().update_player(player_data)
         self.team_cb.setCurrentIndex(self.team)
         self.connect_to_function(self.callable)
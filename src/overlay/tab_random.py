@@ -1,10 +1,11 @@
 import random
-from typing import Dict, Optional
+from typing import Optional
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from overlay.aoe4_data import civ_data, map_data
 from overlay.helper_func import file_path
+from overlay.pixmap_cache import PixmapKey, pixmap_cache
 
 
 class RandomTab(QtWidgets.QWidget):
@@ -13,10 +14,13 @@ class RandomTab(QtWidgets.QWidget):
         super().__init__(parent)
         self.current_map: Optional[str] = None
         self.current_civ: Optional[str] = None
-        self.pixmaps: Dict[str, QtGui.QPixmap] = dict()
         self.initUI()
         self.randomize_map()
         self.randomize_civ()
+        # Scaled down flags also serve as sources for civilization icons
+        pixmap_cache.preload(
+            self.pixmap_key(file_path(f"img/flags/{civ}.webp"), self.civ_image)
+            for civ in civ_data.values())
 
     def initUI(self):
         layout = QtWidgets.QHBoxLayout()
@@ -70,19 +74,16 @@ class RandomTab(QtWidgets.QWidget):
         rnd_map.setMinimumHeight(30)
         map_layout.addWidget(rnd_map)
 
+    @staticmethod
+    def pixmap_key(file_path: str, widget: QtWidgets.QWidget) -> PixmapKey:
+        return PixmapKey(file_path, widget.width(), widget.height(),
+                         QtCore.Qt.KeepAspectRatio,
+                         QtCore.Qt.FastTransformation)
+
     def get_pixmap(self, file_path: str,
                    widget: QtWidgets.QWidget) -> QtGui.QPixmap:
-        """ Asset manager for pixmaps
-
-        Returns a pixmap from `file_path` scaled for `widget`"""
-        if file_path in self.pixmaps:
-            return self.pixmaps[file_path]
-        pixmap = QtGui.QPixmap(file_path)
-        pixmap = pixmap.scaled(widget.width(), widget.height(),
-                               QtCore.Qt.KeepAspectRatio,
-                               QtCore.Qt.FastTransformation)
-        self.pixmaps[file_path] = pixmap
-        return pixmap
+        """ Returns a pixmap from `file_path` scaled for `widget`"""
+        return pixmap_cache.pixmap(*self.pixmap_key(file_path, widget))
 
     def randomize_civ(self):
         civ_name = random.choice(tuple(civ_data.values()))
@@ -1,11 +1,12 @@
-from typing import Any, Dict, List
+from functools import partial
+from typing import Any, Dict, List, Optional
 
 from PyQt5 import QtCore, QtWidgets
 
-from overlay.aoe4_data import civ_data, map_data, mode_data
-from overlay.api_checking import get_leaderboard_data
-from overlay.helper_func import match_mode
+from overlay.aoe4_data import civ_data, mode_data
 from overlay.logging_func import catch_exceptions, get_logger
+from overlay.match_stats import (GameRecord, PlayerStats, StatsCube,
+                                 game_record, load_player_stats, ranked_kind)
 from overlay.settings import settings
 from overlay.worker import scheldule
 
@@ -13,11 +14,18 @@ logger = get_logger(__name__)
 
 
 class StatsTab(QtWidgets.QWidget):
+    updated = QtCore.pyqtSignal()  # Stats changed
 
     def __init__(self, parent):
         super().__init__(parent)
-        self.leaderboard_data: Dict[int, Dict[str, Any]] = {}
-        self.match_data: List[Dict[str, Any]] = []
+        # Rolling windows include one for the overlay record if enabled
+        recent = settings.overlay_recent_games
+        self.extra_games = (recent, ) if recent > 0 else ()
+        self.stats = PlayerStats(self.extra_games)
+        # Games that arrived while the stats were being built
+        self.pending: Optional[List[GameRecord]] = None
+        # Increased when stats are cleared, so older loads are dropped
+        self.generation = 0
         self.initUI()
 
     def initUI(self):
@@ -41,16 +49,17 @@ class StatsTab(QtWidgets.QWidget):
         layout.addWidget(QtWidgets.QLabel("Mode"), row, 0)
         layout.addWidget(QtWidgets.QLabel("Wins"), row, 1)
         layout.addWidget(QtWidgets.QLabel("Losses"), row, 2)
-        layout.addWidget(QtWidgets.QLabel("Drops"), row, 3)
-        layout.addWidget(QtWidgets.QLabel("Games"), row, 4)
-        layout.addWidget(QtWidgets.QLabel("Winrate"), row, 5)
-        layout.addWidget(QtWidgets.QLabel("Rank"), row, 6)
-        layout.addWidget(QtWidgets.QLabel("Rating"), row, 7)
-        layout.addWidget(QtWidgets.QLabel("Max rating"), row, 8)
-        layout.addWidget(QtWidgets.QLabel("Max streak"), row, 9)
+        layout.addWidget(QtWidgets.QLabel("Games"), row, 3)
+        layout.addWidget(QtWidgets.QLabel("Winrate"), row, 4)
+        layout.addWidget(QtWidgets.QLabel("Rating"), row, 5)
+        layout.addWidget(QtWidgets.QLabel("Max rating"), row, 6)
+        layout.addWidget(QtWidgets.QLabel("Max streak"), row, 7)
 
         for i in range(layout.count()):
             layout.itemAt(i).widget().setStyleSheet("font-weight: bold")
+        for column in (5, 6):
+            layout.itemAt(column).widget().setToolTip(
+                "Ranked rating (quick match games have a separate rating)")
 
         self.mode_stats: Dict[int, Dict[str, QtWidgets.QLabel]] = dict()
         for m in mode_data:
@@ -58,10 +67,8 @@ class StatsTab(QtWidgets.QWidget):
             layout.addWidget(QtWidgets.QLabel(f"{m-16}v{m-16}"), row, 0)
             wins = QtWidgets.QLabel("–")
             losses = QtWidgets.QLabel("–")
-            drops = QtWidgets.QLabel("–")
             games = QtWidgets.QLabel("–")
             winrate = QtWidgets.QLabel("–")
-            rank = QtWidgets.QLabel("–")
             rating = QtWidgets.QLabel("–")
             hrating = QtWidgets.QLabel("–")
             streak = QtWidgets.QLabel("–")
@@ -69,10 +76,8 @@ class StatsTab(QtWidgets.QWidget):
             self.mode_stats[m] = {
                 "wins": wins,
                 "losses": losses,
-                "drops": drops,
                 "games": games,
                 "winrate": winrate,
-                "rank": rank,
                 "rating": rating,
                 "hrating": hrating,
                 "streak": streak
@@ -87,15 +92,30 @@ class StatsTab(QtWidgets.QWidget):
         main_layout.addLayout(slayout)
 
         # Games found
-        self.games_found = QtWidgets.QLabel("Recent games analyzed: 0 (?)")
+        self.games_found = QtWidgets.QLabel("Games analyzed: 0")
         self.games_found.setToolTip(
-            "The number of analyzed games might be lower due to API not providing all data"
-        )
+            "Finished games from the local match history")
         self.games_found.setMinimumWidth(200)
         self.games_found.setStyleSheet("QLabel {font-weight: bold}")
         slayout.addWidget(self.games_found)
         slayout.addItem(QtWidgets.QSpacerItem(40, 0))
 
+        # Period label
+        period = QtWidgets.QLabel("Period:")
+        period.setStyleSheet("font-weight: bold")
+        slayout.addWidget(period)
+
+        # Period combobox
+        self.period_box = QtWidgets.QComboBox()
+        self.period_box.setMaximumWidth(200)
+        self.period_box.setToolTip("Show stats only for recent games")
+        slayout.addWidget(self.period_box)
+        self.period_box.addItem("All games")
+        for name in self.stats.windows:
+            self.period_box.addItem(name)
+        self.period_box.currentIndexChanged.connect(self.period_changed)
+        slayout.addItem(QtWidgets.QSpacerItem(20, 0))
+
         # Filtering mode label
         mode = QtWidgets.QLabel("Filter mode:")
         mode.setStyleSheet("font-weight: bold")
@@ -109,7 +129,8 @@ class StatsTab(QtWidgets.QWidget):
         self.mode_box.addItem("All")
         for mode in mode_data.values():
             self.mode_box.addItem(mode)
-        self.mode_box.currentIndexChanged.connect(self.update_civ_map_stats)
+        self.mode_box.currentIndexChanged.connect(
+            lambda: self.update_civ_map_stats())
         slayout.addItem(QtWidgets.QSpacerItem(20, 0))
 
         # Filtering civ label
@@ -125,7 +146,8 @@ class StatsTab(QtWidgets.QWidget):
         self.civ_box.addItem("All")
         for civ in civ_data.values():
             self.civ_box.addItem(civ)
-        self.civ_box.currentIndexChanged.connect(self.update_civ_map_stats)
+        self.civ_box.currentIndexChanged.connect(
+            lambda: self.update_civ_map_stats())
 
         ### Results
         result_layout = QtWidgets.QHBoxLayout()
@@ -167,8 +189,9 @@ class StatsTab(QtWidgets.QWidget):
         # Map stats
         map_group = QtWidgets.QGroupBox("Map stats")
         result_layout.addWidget(map_group)
-        map_layout = QtWidgets.QGridLayout()
-        map_group.setLayout(map_layout)
+        self.map_layout = QtWidgets.QGridLayout()
+        self.map_layout.setAlignment(QtCore.Qt.AlignTop)
+        map_group.setLayout(self.map_layout)
 
         # Map headers
         map_headers = []
@@ -178,145 +201,152 @@ class StatsTab(QtWidgets.QWidget):
         map_headers.append(QtWidgets.QLabel("Winrate"))
 
         for column, widget in enumerate(map_headers):
-            map_layout.addWidget(widget, 0, column)
+            self.map_layout.addWidget(widget, 0, column)
             widget.setStyleSheet("font-weight: bold")
 
-        # Add maps
-        self.map_widgets = {}
-        for row, m in enumerate(map_data.values()):
-            row += 1
-            self.map_widgets[m] = dict()
-            self.map_widgets[m]['name'] = QtWidgets.QLabel(m)
-            self.map_widgets[m]['name'].setMinimumWidth(130)
-            map_layout.addWidget(self.map_widgets[m]['name'], row, 0)
-            self.map_widgets[m]['wins'] = QtWidgets.QLabel("–")
-            map_layout.addWidget(self.map_widgets[m]['wins'], row, 1)
-            self.map_widgets[m]['losses'] = QtWidgets.QLabel("–")
-            map_layout.addWidget(self.map_widgets[m]['losses'], row, 2)
-            self.map_widgets[m]['winrate'] = QtWidgets.QLabel("–")
-            map_layout.addWidget(self.map_widgets[m]['winrate'], row, 3)
-
-    def run_mode_update(self):
-        """ Runs update for mode stats"""
-        scheldule(self.update_leaderboard_data, self.get_all_leaderboard_data)
-
-    def get_all_leaderboard_data(self):
-        result = dict()
-        for leaderboard_id in mode_data:
-            result[leaderboard_id] = get_leaderboard_data(leaderboard_id)
-        return result
-
-    def update_leaderboard_data(self, leaderboard: Dict[int, Dict[str, Any]]):
-        """ Update data and widgets"""
-        if leaderboard is None:
-            logger.warning("No leaderboard data")
-            return
-        self.leaderboard_data = leaderboard
-        self.update_leaderboard_widgets()
-
-    @catch_exceptions(logger)
-    def update_leaderboard_widgets(self):
-        for m, data in self.leaderboard_data.items():
-            if not data.get('leaderboard', False):
-                for widget in self.mode_stats[m].values():
-                    widget.setText("–")
-                continue
-
-            data = data['leaderboard'][0]
-            self.mode_stats[m]['wins'].setText(str(data['wins']))
-            self.mode_stats[m]['losses'].setText(str(data['losses']))
-            self.mode_stats[m]['games'].setText(str(data['games']))
-            self.mode_stats[m]['drops'].setText(str(data['drops']))
-            self.mode_stats[m]['rank'].setText(str(data['rank']))
-            self.mode_stats[m]['rating'].setText(str(data['rating']))
-            self.mode_stats[m]['hrating'].setText(str(data['highest_rating']))
-            self.mode_stats[m]['streak'].setText(str(data['highest_streak']))
-            games = data['wins'] + data['losses']
-            winrate = data['wins'] / games if games else 0
-            self.mode_stats[m]['winrate'].setText(f"{winrate:.2%}")
+        # Maps are added as they are found in games
+        self.map_widgets: Dict[str, Dict[str, QtWidgets.QLabel]] = {}
+
+    def add_map_row(self, map_name: str):
+        """ Adds widgets for a new map"""
+        row = len(self.map_widgets) + 1
+        self.map_widgets[map_name] = dict()
+        self.map_widgets[map_name]['name'] = QtWidgets.QLabel(map_name)
+        self.map_widgets[map_name]['name'].setMinimumWidth(130)
+        for column, key in enumerate(("name", "wins", "losses", "winrate")):
+            if key != "name":
+                self.map_widgets[map_name][key] = QtWidgets.QLabel("–")
+            self.map_layout.addWidget(self.map_widgets[map_name][key], row,
+                                      column)
+
+    def load(self, profile_id: int):
+        """ Builds stats from stored games in a worker"""
+        self.generation += 1
+        self.pending = []
+        scheldule(partial(self.loaded, generation=self.generation),
+                  load_player_stats, profile_id, self.extra_games)
+
+    def loaded(self, stats: PlayerStats, generation: int):
+        if generation != self.generation:
+            return  # Stats of the previous profile
+        for record in self.pending or ():
+            stats.add(record)
+        self.pending = None
+        self.stats = stats
+        self.update_mode_stats()
+        self.update_civ_map_stats()
+        self.updated.emit()
 
     @catch_exceptions(logger)
     def update_other_stats(self, match_history: List[Any]):
-        # Add to our match history data
-        present_match_ids = {m['match_id'] for m in self.match_data}
-        for match in reversed(match_history):
-            if match['match_id'] not in present_match_ids:
-                self.add_match_data(match)
-        self.update_civ_map_stats()
+        """ Adds new games to statistics and updates widgets"""
+        added = 0
+        for match in match_history:
+            if match['game_id'] in self.stats.game_ids:
+                continue
+            record = game_record(match, settings.profile_id)
+            if record is None:
+                continue
+            if self.pending is not None:
+                self.pending.append(record)
+            elif self.stats.add(record):
+                added += 1
+        if added:
+            self.update_mode_stats()
+            self.update_civ_map_stats()
+            self.updated.emit()
         logger.info(
-            f'Received {len(match_history)} | Saved {len(self.match_data)} games'
+            f'Received {len(match_history)} | Saved {len(self.stats.game_ids)} games'
         )
 
-    @catch_exceptions(logger)
-    def add_match_data(self, match: Dict[str, Any]):
-        """ Saves only specific data from the match history data"""
-        game = dict()  # includes: win, mode, map, civ
-        if match['result'] not in {"Loss", "Win"}:
-            return
-        game['map'] = match.get('map_type', -1)
-        game['win'] = match['result'] == "Win"
-        game['mode'] = match_mode(match)
-        game['match_id'] = match['match_id']
-        for player in match['players']:
-            if player['profile_id'] == settings.profile_id:
-                game['civ'] = player['civ']
-                break
-        if 'civ' not in game:
-            return
-        self.match_data.append(game)
-
     def clear_match_data(self):
-        self.match_data = []
+        self.generation += 1
+        self.pending = None
+        self.stats = PlayerStats(self.extra_games)
+        for widgets in self.map_widgets.values():
+            for widget in widgets.values():
+                self.map_layout.removeWidget(widget)
+                widget.deleteLater()
+        self.map_widgets = dict()
+        self.update_mode_stats()
+        self.update_civ_map_stats()
+
+    def selected_cube(self) -> StatsCube:
+        """ Returns stats for the selected period"""
+        if self.period_box.currentIndex() == 0:
+            return self.stats.cube
+        window = self.stats.windows[self.period_box.currentText()]
+        window.evict()
+        return window.cube
+
+    def period_changed(self):
+        self.update_mode_stats()
         self.update_civ_map_stats()
 
+    def recent_record(self, games: int) -> str:
+        """ Returns the record of the latest games (e.g. "Last 20: 14-6")"""
+        window = self.stats.windows.get(f"Last {games} games")
+        return window.record() if window is not None else ""
+
+    @catch_exceptions(logger)
+    def update_mode_stats(self):
+        cube = self.selected_cube()
+        for mode, widgets in self.mode_stats.items():
+            wins, losses = cube.total(mode)
+            games = wins + losses
+            widgets['wins'].setText(str(wins) if games else "–")
+            widgets['losses'].setText(str(losses) if games else "–")
+            widgets['games'].setText(str(games) if games else "–")
+            widgets['winrate'].setText(f"{wins/games:.2%}" if games else "–")
+            rating = self.stats.current_rating.get(ranked_kind(mode))
+            widgets['rating'].setText(str(rating[1]) if rating else "–")
+            max_rating = self.stats.max_rating.get(ranked_kind(mode))
+            widgets['hrating'].setText(str(max_rating) if max_rating else "–")
+            streak = self.stats.streaks.longest(mode)
+            widgets['streak'].setText(str(streak) if streak else "–")
+
     @catch_exceptions(logger)
     def update_civ_map_stats(self):
-        # Filter games based on the selected civilization
-        fdata = self.match_data
+        # Filters based on the selected civilization and mode
+        filter_civ = None
         if self.civ_box.currentIndex() != 0:
             filter_civ = self.civ_box.currentIndex() - 1
-            fdata = [g for g in self.match_data if g['civ'] == filter_civ]
 
-        # Filter games based on the selected mode
+        filter_mode = None
         if self.mode_box.currentIndex() != 0:
             filter_mode = self.mode_box.currentIndex() + 16
-            fdata = [g for g in fdata if g['mode'] == filter_mode]
+
+        cube = self.selected_cube()
 
         # Update the number of analyzed games
-        self.games_found.setText(f"Recent games analyzed: {len(fdata)} (?)")
-
-        # Get specific civ and map data from filtered games
-        civ_stats = {c_index: {"wins": 0, "losses": 0} for c_index in civ_data}
-        map_stats = {m_index: {"wins": 0, "losses": 0} for m_index in map_data}
-        # game = {"map": None, "win": None, "mode": None, "civ": None}
-        for game in fdata:
-            c = game['civ']
-            m = game['map']
-            if game['win']:
-                civ_stats[c]['wins'] += 1
-                map_stats[m]['wins'] += 1
-            else:
-                civ_stats[c]['losses'] += 1
-                map_stats[m]['losses'] += 1
+        self.games_found.setText(
+            f"Games analyzed: {sum(cube.total(filter_mode, filter_civ))}")
 
         # Update civ widgets
-        for civ_index, c_data in civ_stats.items():
-            civ_name = civ_data[civ_index]
-            swins = str(c_data['wins']) if c_data['wins'] else "–"
-            self.civ_widgets[civ_name]['wins'].setText(swins)
-            slosses = str(c_data['losses']) if c_data['losses'] else "–"
-            self.civ_widgets[civ_name]['losses'].setText(slosses)
-            games = c_data['wins'] + c_data['losses']
-            swinrate = f"{c_data['wins']/games:.1%}" if games else "–"
+        civ_stats = cube.civ_stats(filter_mode)
+        for civ_index, civ_name in civ_data.items():
+            wins, losses = civ_stats[civ_index]
+            if filter_civ is not None and civ_index != filter_civ:
+                wins = losses = 0
+            self.civ_widgets[civ_name]['wins'].setText(
+                str(wins) if wins else "–")
+            self.civ_widgets[civ_name]['losses'].setText(
+                str(losses) if losses else "–")
+            games = wins + losses
+            swinrate = f"{wins/games:.1%}" if games else "–"
             self.civ_widgets[civ_name]['winrate'].setText(swinrate)
 
-        # Update map widgets
-        for map_index, m_data in map_stats.items():
-            map_name = map_data[map_index]
-            swins = str(m_data['wins']) if m_data['wins'] else "–"
-            self.map_widgets[map_name]['wins'].setText(swins)
-            slosses = str(m_data['losses']) if m_data['losses'] else "–"
-            self.map_widgets[map_name]['losses'].setText(slosses)
-            games = m_data['wins'] + m_data['losses']
-            swinrate = f"{m_data['wins']/games:.1%}" if games else "–"
+        # Update map widgets (maps not in the selected period are empty)
+        map_stats = cube.map_stats(filter_mode, filter_civ)
+        for map_name in map_stats:
+            if map_name not in self.map_widgets:
+                self.add_map_row(map_name)
+        for map_name in self.map_widgets:
+            wins, losses = map_stats.get(map_name, (0, 0))
+            self.map_widgets[map_name]['wins'].setText(
+                str(wins) if wins else "–")
+            self.map_widgets[map_name]['losses'].setText(
+                str(losses) if losses else "–")
+            games = wins + losses
+            swinrate = f"{wins/games:.1%}" if games else "–"
             self.map_widgets[map_name]['winrate'].setText(swinrate)
@@ -1,21 +1,159 @@
 import asyncio
+import copy
 import json
 import threading
+from collections import deque
+from http import HTTPStatus
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 
 import websockets
+from websockets.datastructures import Headers
 from websockets.legacy.server import serve as websockets_serve
 
 from overlay.logging_func import get_logger
+from overlay.static_server import Response, serve_file
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 lock = threading.Lock()
 logger = get_logger(__name__)
 
+def encode_message(message: Dict[str, Any]) -> str:
+    """ Serializes a message to JSON. Uses `orjson` when it's available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(message).decode()
+        except TypeError:  # e.g. non-string dictionary keys
+            ...
+    return json.dumps(message)
+
+
+def _escape_pointer(key: Any) -> str:
+    """ Escapes a key for use in a JSON pointer"""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """ Returns a list of JSON patch operations (add, remove, replace)
+    that transform `old` into `new`"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = []
+        for key in old:
+            if key not in new:
+                patch.append({
+                    "op": "remove",
+                    "path": f"{path}/{_escape_pointer(key)}"
+                })
+        for key, value in new.items():
+            key_path = f"{path}/{_escape_pointer(key)}"
+            if key not in old:
+                patch.append({"op": "add", "path": key_path, "value": value})
+            else:
+                patch.extend(make_patch(old[key], value, key_path))
+        return patch
+
+    if isinstance(old, (list, tuple)) and isinstance(new, (list, tuple)):
+        patch = []
+        common = min(len(old), len(new))
+        for idx in range(common):
+            patch.extend(make_patch(old[idx], new[idx], f"{path}/{idx}"))
+        # Remove from the end so the indexes stay valid
+        for idx in range(len(old) - 1, common - 1, -1):
+            patch.append({"op": "remove", "path": f"{path}/{idx}"})
+        for idx in range(common, len(new)):
+            patch.append({
+                "op": "add",
+                "path": f"{path}/{idx}",
+                "value": new[idx]
+            })
+        return patch
+
+    if old == new and type(old) == type(new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+class Client:
+    """ State of a single connected websocket client
+
+    Messages waiting to be sent are kept in a bounded queue. A new message
+    replaces a queued message of the same type (it's superseded by it)."""
+    def __init__(self, queue_size: int):
+        self.new_message = asyncio.Event()
+        self.queue: Deque[Tuple[str, str]] = deque()  # (type, encoded message)
+        self.queue_size = queue_size
+        self.resync: bool = True  # Send the full state first
+        self.closed: bool = False
+        # Stats
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+        self.timeouts: int = 0  # Consecutive send timeouts
+
+    def put(self, message_type: str, message: str, snapshot: str):
+        """ Queues a message for this client.
+        `snapshot` is used when an older message of the same type gets replaced."""
+        for idx, (queued_type, _) in enumerate(self.queue):
+            if queued_type == message_type:
+                # Patches can't be merged, so replace them with the full state
+                del self.queue[idx]
+                self.queue.append((message_type, snapshot))
+                self.coalesced += 1
+                break
+        else:
+            if len(self.queue) >= self.queue_size:
+                self.drop_queue()
+            self.queue.append((message_type, message))
+        self.new_message.set()
+
+    def drop_queue(self):
+        """ Drops all queued messages, the client will get the full state instead"""
+        self.dropped += len(self.queue)
+        self.queue.clear()
+        self.resync = True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts
+        }
+
 
 class Websocket_manager():
     """ Class managing connection through a websocket to the HTML file"""
-    def __init__(self, port: int):
-        self.overlay_messages = []
+    def __init__(self,
+                 port: int,
+                 queue_size: int = 16,
+                 slow_client_policy: str = "drop",
+                 max_timeouts: int = 3,
+                 stats_interval: float = 60):
+        """
+        Args:
+            `port` : websocket port
+            `queue_size` : maximum number of messages waiting for a client
+            `slow_client_policy` : what to do with a client that timed-out
+                `max_timeouts` times in a row. "drop" drops its queued messages
+                and resyncs it later, "disconnect" closes the connection.
+            `stats_interval` : seconds between logging changed client stats
+        """
         self.port = port
+        self.queue_size = max(queue_size, 1)
+        self.slow_client_policy = slow_client_policy
+        self.max_timeouts = max(max_timeouts, 1)
+        self.stats_interval = stats_interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Latest full encoded message for each message type (color, player_data, ...)
+        self.state: Dict[str, str] = dict()
+        self.clients: Set[Client] = set()
+        # Player data are versioned and sent as patches against the previous version
+        self.player_data: Optional[Dict[str, Any]] = None
+        self.player_data_version: int = 0
 
     def run(self):
         self.thread_server = threading.Thread(target=self._start_manager,
@@ -26,61 +164,215 @@ class Websocket_manager():
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            start_server = websockets_serve(self.manager, 'localhost',
-                                            self.port)
+            start_server = websockets_serve(
+                self.manager,
+                'localhost',
+                self.port,
+                process_request=self.process_request)
             loop.run_until_complete(start_server)
-            loop.run_forever()
         except Exception:
+            # Messages keep updating the state without queuing callbacks
             logger.exception("Failed to start manager")
+            return
+        # Messages are passed to the loop only once it serves clients
+        with lock:
+            self.loop = loop
+        loop.create_task(self._log_client_stats())
+        loop.run_forever()
+
+    @staticmethod
+    async def process_request(path: str,
+                              request_headers: Headers) -> Optional[Response]:
+        """ Serves overlay files over HTTP on the websocket port.
+        Returns `None` for websocket requests."""
+        if request_headers.get("Upgrade", "").lower() == "websocket":
+            return None
+        try:
+            # Read files outside of the event loop
+            return await asyncio.get_running_loop().run_in_executor(
+                None, serve_file, path, request_headers)
+        except Exception:
+            logger.exception(f"Failed to serve {path}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, Headers(), b""
 
     @staticmethod
     async def _send_ws_message(
             websocket: websockets.legacy.server.WebSocketServerProtocol,
-            message):
-        message = json.dumps(message)
+            message: str):
         await asyncio.wait_for(asyncio.gather(websocket.send(message)),
                                timeout=1)
 
+    def _add_message(self, message_type: str, message: str, snapshot: str):
+        """ Stores the encoded message and queues it for all clients.
+        Runs in the event loop thread once the loop exists.
+
+        `message` is sent to connected clients, `snapshot` is the full state
+        for this message type used when (re)synchronizing a client."""
+        self.state[message_type] = snapshot
+        for client in self.clients:
+            client.put(message_type, message, snapshot)
+
+    def client_stats(self) -> List[Dict[str, int]]:
+        """ Returns queue depth, sent, dropped, coalesced messages and
+        consecutive timeouts for each connected client"""
+        return [client.stats() for client in tuple(self.clients)]
+
+    async def _log_client_stats(self):
+        """ Logs queue depth and drops of connected clients when they change"""
+        logged = []
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            stats = self.client_stats()
+            # Sent messages alone aren't worth a log line
+            unsent = [{
+                key: value
+                for key, value in client.items() if key != "sent"
+            } for client in stats]
+            if unsent != logged:
+                logged = unsent
+                logger.info(f"Websocket clients: {stats}")
+
+    async def _receive(
+            self, websocket: websockets.legacy.server.WebSocketServerProtocol,
+            client: Client):
+        """ Handles messages from the client (resync requests) """
+        try:
+            async for text in websocket:
+                try:
+                    request = json.loads(text)
+                except ValueError:
+                    logger.warning(f"Invalid websocket message: {text}")
+                    continue
+                if not isinstance(request, dict):
+                    logger.warning(f"Invalid websocket message: {text}")
+                    continue
+                if request.get('type') == 'resync':
+                    client.resync = True
+                    client.new_message.set()
+        except websockets.exceptions.ConnectionClosed:
+            ...
+        finally:
+            client.closed = True
+            client.new_message.set()
+
     async def manager(
             self, websocket: websockets.legacy.server.WebSocketServerProtocol,
             path: str):
         """ Manages websocket connection for each client """
         logger.info(f"Opening: {websocket}")
+        client = Client(self.queue_size)
+        self.clients.add(client)
+        receiver = asyncio.ensure_future(self._receive(websocket, client))
 
-        # Send the first one (init) and last one message if there is one
-        if self.overlay_messages:
-            await self._send_ws_message(websocket, self.overlay_messages[0])
-            if self.overlay_messages[0] != self.overlay_messages[-1]:
-                await self._send_ws_message(websocket,
-                                            self.overlay_messages[-1])
+        try:
+            while not client.closed:
+                try:
+                    # Send the full state on connect, on request or after dropping messages
+                    if client.resync:
+                        client.resync = False
+                        client.queue.clear()
+                        try:
+                            for message in tuple(self.state.values()):
+                                await self._send_ws_message(websocket, message)
+                                client.sent += 1
+                        except asyncio.TimeoutError:
+                            client.resync = True
+                            raise
+                        client.timeouts = 0
+                        continue
 
-        sent = len(self.overlay_messages)
+                    if not client.queue:
+                        # Wait until `send` notifies us about a new message
+                        client.new_message.clear()
+                        await client.new_message.wait()
+                        continue
 
-        while True:
-            try:
-                if len(self.overlay_messages) == sent:
-                    continue
-                await self._send_ws_message(websocket,
-                                            self.overlay_messages[sent])
-                sent += 1
-
-            except asyncio.TimeoutError:
-                logger.warning(f'#{sent-1} message was timed-out.')
-            except websockets.exceptions.ConnectionClosedOK:
-                logger.warning('Websocket connection closed (ok).')
-                break
-            except websockets.exceptions.ConnectionClosedError:
-                logger.warning('Websocket connection closed (error).')
-                break
-            except websockets.exceptions.ConnectionClosed:
-                logger.warning('Websocket connection closed.')
-                break
-            except Exception:
-                logger.exception("")
-            finally:
-                await asyncio.sleep(0.1)
+                    _, message = client.queue.popleft()
+                    await self._send_ws_message(websocket, message)
+                    client.sent += 1
+                    client.timeouts = 0
+
+                except asyncio.TimeoutError:
+                    client.timeouts += 1
+                    logger.warning(
+                        f'Message was timed-out ({client.timeouts}x in a row).')
+                    if client.timeouts < self.max_timeouts:
+                        continue
+                    if self.slow_client_policy == "disconnect":
+                        logger.warning('Disconnecting slow websocket client.')
+                        await websocket.close()
+                        break
+                    client.drop_queue()
+                    client.timeouts = 0
+                except websockets.exceptions.ConnectionClosedOK:
+                    logger.warning('Websocket connection closed (ok).')
+                    break
+                except websockets.exceptions.ConnectionClosedError:
+                    logger.warning('Websocket connection closed (error).')
+                    break
+                except websockets.exceptions.ConnectionClosed:
+                    logger.warning('Websocket connection closed.')
+                    break
+                except Exception:
+                    logger.exception("")
+                    await asyncio.sleep(0.1)
+        finally:
+            receiver.cancel()
+            self.clients.discard(client)
+            logger.info(f"Closed: {websocket} {client.stats()}")
+
+    def _version_player_data(
+            self, data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """ Creates a new player data version
+
+        Returns the encoded message to broadcast (a patch against the previous
+        version if it's smaller) and the full snapshot. `None` if nothing changed.
+        Called with `lock` held, so versions are queued in order."""
+        previous = self.player_data
+        patch = make_patch(previous, data) if previous is not None else None
+        if patch == []:
+            return None
+        self.player_data = copy.deepcopy(data)
+        self.player_data_version += 1
+        version = self.player_data_version
+
+        snapshot = encode_message({
+            "type": "player_data",
+            "version": version,
+            "data": data
+        })
+        if patch is None:
+            return snapshot, snapshot
+
+        message = encode_message({
+            "type": "player_data_patch",
+            "base": version - 1,
+            "version": version,
+            "patch": patch
+        })
+        if len(message) >= len(snapshot):
+            return snapshot, snapshot
+        return message, snapshot
+
+    def send(self, message: Dict[str, Any]):
+        """ Send message throught a websocket
+
+        Can be called from any thread. The message is serialized once here
+        and the encoded string is shared by all clients."""
+        message_type = message.get('type', '')
+        if message_type != "player_data":
+            encoded = snapshot = encode_message(message)
 
-    def send(self, message):
-        """ Send message throught a websocket """
         with lock:
-            self.overlay_messages.append(message)
+            if message_type == "player_data":
+                # Versioned and queued under one lock, so patches from
+                # different threads reach the loop in version order
+                versioned = self._version_player_data(message['data'])
+                if versioned is None:
+                    return
+                encoded, snapshot = versioned
+            if self.loop is None:
+                self._add_message(message_type, encoded, snapshot)
+            else:
+                self.loop.call_soon_threadsafe(self._add_message,
+                                               message_type, encoded, snapshot)
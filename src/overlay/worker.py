@@ -75,10 +75,18 @@ class Worker(QtCore.QRunnable):
 def scheldule(result_callback: Callable,
               worker_function: Callable,
               *args,
-              error_callback: Optional[Callable] = None):
-    """ Scheldules work on the worker function and passes the result to the callback function"""
-    thread = Worker(worker_function, *args)
+              error_callback: Optional[Callable] = None,
+              progress_callback: Optional[Callable] = None):
+    """ Scheldules work on the worker function and passes the result to the callback function
+
+    If `progress_callback` is given, the worker function receives a `progress_callback`
+    signal and partial results emitted through it are passed to `progress_callback`."""
+    if progress_callback is not None:
+        thread = Worker(worker_function, *args, progress_callback=None)
+        thread.signals.progress.connect(progress_callback)
+    else:
+        thread = Worker(worker_function, *args)
     thread.signals.result.connect(result_callback)
     if error_callback is not None:
         thread.signals.error.connect(error_callback)
-    THREADPOOL.start(thread)
\ No newline at end of file
+    THREADPOOL.start(thread)
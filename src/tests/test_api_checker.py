@@ -0,0 +1,89 @@
+"""
+Stopping and waking up the thread checking for new games
+and detecting when a game finishes
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import json
+import threading
+import time
+
+import overlay.api_checking as api_checking
+from overlay.api_checking import Api_checker
+
+MAX_LATENCY = 0.02  # Seconds
+
+
+def start(checker: Api_checker, delayed_seconds: int) -> threading.Thread:
+    thread = threading.Thread(target=checker.check_for_new_game,
+                              args=(delayed_seconds, ),
+                              daemon=True)
+    thread.start()
+    time.sleep(0.05)  # Let it fall asleep
+    assert thread.is_alive()
+    return thread
+
+
+def stop_latency(checker: Api_checker, thread: threading.Thread) -> float:
+    start = time.perf_counter()
+    checker.stop()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+    return time.perf_counter() - start
+
+
+def test_stop_initial_delay(monkeypatch):
+    checker = Api_checker()
+    monkeypatch.setattr(checker, "get_data", lambda: None)
+    thread = start(checker, delayed_seconds=60)
+    assert stop_latency(checker, thread) < MAX_LATENCY
+
+
+def test_stop_between_checks(monkeypatch):
+    checker = Api_checker()
+    checks = []
+    monkeypatch.setattr(checker, "get_data", lambda: checks.append(1))
+    monkeypatch.setattr(checker.scheduler, "next_delay", lambda: 60)
+    thread = start(checker, delayed_seconds=0)
+    assert len(checks) == 1
+    assert stop_latency(checker, thread) < MAX_LATENCY
+    assert len(checks) == 1
+
+
+def test_check_now(monkeypatch):
+    checker = Api_checker()
+    checks = []
+    monkeypatch.setattr(checker, "get_data", lambda: checks.append(1))
+    monkeypatch.setattr(checker.scheduler, "next_delay", lambda: 60)
+    thread = start(checker, delayed_seconds=0)
+    checker.check_now()
+    time.sleep(0.05)
+    assert len(checks) == 2
+    stop_latency(checker, thread)
+
+
+class Response:
+    def __init__(self, data):
+        self.status_code = 200
+        self.headers = {}
+        self.text = json.dumps(data)
+
+
+def test_game_finished(monkeypatch):
+    game = {
+        'game_id': 1,
+        'kind': "rm_1v1",
+        'started_at': "2026-10-18T10:00:00.000Z",
+        'duration': None,
+        'ongoing': True
+    }
+    monkeypatch.setattr(api_checking, "conditional_get",
+                        lambda url: Response(game))
+    checker = Api_checker()
+    assert checker.get_data()['game_id'] == 1
+    assert checker.get_data() is None  # Still ongoing
+
+    game = {**game, 'ongoing': False, 'duration': 1200}
+    assert checker.get_data() == {"game_finished": 1}
+    assert checker.get_data() is None
@@ -0,0 +1,88 @@
+"""
+Zooming and panning `GraphWidget` without rebuilding the cache for each step
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import os
+from typing import Iterator
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from overlay.graph_widget import GraphWidget
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def graph(app) -> Iterator[GraphWidget]:
+    graph = GraphWidget()
+    graph.resize(800, 400)
+    graph.plot(range(1000), [i % 50 for i in range(1000)])
+    graph.show()
+    QtWidgets.QApplication.processEvents()
+    graph.repaint()  # Builds the cache
+    yield graph
+    graph.close()
+
+
+def mouse(kind: QtCore.QEvent.Type, x: int) -> QtGui.QMouseEvent:
+    return QtGui.QMouseEvent(kind, QtCore.QPointF(x, 200),
+                             QtCore.Qt.LeftButton, QtCore.Qt.LeftButton,
+                             QtCore.Qt.NoModifier)
+
+
+def image_x(graph: GraphWidget, x: float) -> float:
+    return graph._transform().map(QtCore.QPointF(x, 0)).x()
+
+
+def test_pan_moves_cached_series(graph):
+    graph.zoom(0.5)
+    graph._rebuild()
+    graph.repaint()
+    cache = graph._cache
+
+    graph.mousePressEvent(mouse(QtCore.QEvent.MouseButtonPress, 400))
+    for x in range(390, 299, -10):
+        graph.mouseMoveEvent(mouse(QtCore.QEvent.MouseMove, x))
+        graph.repaint()
+    assert graph._cache is cache
+    moved = image_x(graph, 500)
+    # Data moved with the mouse
+    assert moved == pytest.approx(
+        cache.transform.map(QtCore.QPointF(500, 0)).x() - 100, abs=1)
+
+    graph.mouseReleaseEvent(mouse(QtCore.QEvent.MouseButtonRelease, 300))
+    graph.repaint()
+    assert graph._cache is not cache
+    assert graph._cache.x_limits == graph.view
+    assert image_x(graph, 500) == pytest.approx(moved, abs=1)
+
+
+def test_zoom_rebuilds_once(graph):
+    cache = graph._cache
+    for _ in range(5):
+        graph.zoom(0.9, 500)
+        graph.repaint()
+    assert graph._cache is cache
+    zoomed = image_x(graph, 600)
+
+    QtCore.QThread.msleep(GraphWidget.REBUILD_DELAY + 50)
+    QtWidgets.QApplication.processEvents()
+    graph.repaint()
+    assert graph._cache is not cache
+    assert image_x(graph, 600) == pytest.approx(zoomed, abs=1)
+
+
+def test_data_change_rebuilds(graph):
+    cache = graph._cache
+    graph.append(-1, (1000, ), (10, ))
+    graph.repaint()
+    assert graph._cache is not cache
@@ -0,0 +1,63 @@
+"""
+Adding synced games to the match history table model
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import os
+from typing import Any, Dict
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtWidgets
+
+from overlay.tab_games import MatchHistoryModel
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def match(game_id: int, **changes: Any) -> Dict[str, Any]:
+    player = {
+        'profile_id': 1,
+        'name': "Player",
+        'civilization': "english",
+        'result': "win",
+        'rating_diff': 16
+    }
+    return {
+        'game_id': game_id,
+        'started_at': "2026-10-18T10:00:00.000Z",
+        'kind': "rm_1v1",
+        'map': "Dry Arabia",
+        'ongoing': False,
+        'teams': [[{
+            'player': player
+        }], [{
+            'player': {
+                **player, 'profile_id': 2,
+                'result': "loss"
+            }
+        }]],
+        **changes
+    }
+
+
+def test_failed_row_is_retried(app):
+    model = MatchHistoryModel()
+    with pytest.raises(KeyError):
+        model.add_matches([match(2), match(1, teams=[[{}]])], 10)
+    assert model.game_ids == set()
+    assert model.rows == []
+
+    model.add_matches([match(2), match(1), match(1)], 10)
+    assert [row.game_id for row in model.rows] == [2, 1]
+    assert model.game_ids == {1, 2}
+
+    model.add_matches([match(3), match(2)], 2)
+    assert [row.game_id for row in model.rows] == [3, 2]
+    assert model.game_ids == {2, 3}
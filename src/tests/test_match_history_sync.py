@@ -0,0 +1,112 @@
+"""
+Cancelling match history sync when the profile changes
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+import overlay.api_checking as api_checking
+from overlay.api_checking import MatchHistorySync
+
+PAGE_SIZE = MatchHistorySync.PAGE_SIZE
+
+
+class Store:
+    """ Match store keeping games in memory"""
+    def __init__(self):
+        self.games: List[Dict[str, Any]] = []
+        self.synced: Dict[int, int] = dict()
+
+    def synced_game_id(self, profile_id: int):
+        return self.synced.get(profile_id)
+
+    def set_synced_game_id(self, profile_id: int, game_id: int):
+        self.synced[profile_id] = game_id
+
+    def add_games(self, profile_id: int, games: List[Dict[str, Any]]):
+        self.games.extend(games)
+
+
+class Emitter:
+    def __init__(self):
+        self.pages: List[List[Dict[str, Any]]] = []
+
+    def emit(self, games: List[Dict[str, Any]]):
+        self.pages.append(games)
+
+
+class Server:
+    """ Serves two and a half pages of games, requests wait for `resume`"""
+    def __init__(self):
+        self.requested = threading.Event()
+        self.resume = threading.Event()
+        self.resume.set()
+
+    def page(self, profile_id: int, page: int, limit: int):
+        self.requested.set()
+        self.resume.wait()
+        first = 1000 - (page - 1) * limit
+        count = limit if page < 3 else limit // 2
+        return [{
+            'game_id': first - i,
+            'ongoing': False
+        } for i in range(count)]
+
+
+@pytest.fixture
+def store(monkeypatch) -> Store:
+    store = Store()
+    monkeypatch.setattr(api_checking, "match_store", store)
+    return store
+
+
+@pytest.fixture
+def server(monkeypatch) -> Server:
+    server = Server()
+    monkeypatch.setattr(api_checking, "get_match_history_page", server.page)
+    return server
+
+
+def test_sync(store, server):
+    sync = MatchHistorySync()
+    emitter = Emitter()
+    assert sync.sync(10000, progress_callback=emitter) == 2.5 * PAGE_SIZE
+    assert [len(page) for page in emitter.pages] == [50, 50, 25]
+    assert sync.sync(10000, progress_callback=emitter) == 0
+    assert len(emitter.pages) == 3
+
+
+def test_reset_cancels_sync(store, server):
+    sync = MatchHistorySync()
+    emitter = Emitter()
+    results = []
+    server.resume.clear()
+    thread = threading.Thread(
+        target=lambda: results.append(sync.sync(10000, sync.generation, emitter)))
+    thread.start()
+    assert server.requested.wait(1)
+
+    # Doesn't wait for the request
+    start = time.perf_counter()
+    sync.reset()
+    assert time.perf_counter() - start < 0.01
+
+    server.resume.set()
+    thread.join(1)
+    assert results == [None]
+    assert emitter.pages == []
+    assert store.games == []
+    assert store.synced == {}
+
+
+def test_cancelled_before_start(store, server):
+    sync = MatchHistorySync()
+    generation = sync.generation
+    sync.reset()
+    assert sync.sync(10000, generation) is None
+    assert store.games == []
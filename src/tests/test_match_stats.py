@@ -0,0 +1,97 @@
+"""
+Game records and stats computed from them
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+from overlay.match_stats import (GameRecord, PlayerStats, RollingWindow,
+                                 StatsCube, WinStreaks, ranked_kind,
+                                 record_from_columns)
+
+
+def record(game_id: int, win: bool, mode: int = 17,
+           map_name: str = "Dry Arabia") -> GameRecord:
+    return GameRecord(game_id, 1_650_000_000 + game_id * 600, 0, map_name,
+                      mode, win, 1000)
+
+
+def test_record_rating_after_game():
+    row = (1, "2022-06-01T18:30:12.000Z", "rm_1v1", "Dry Arabia", "english",
+           "win", 1200, 16, "french", 1180)
+    game = record_from_columns(row)
+    assert game.rating == 1216
+    assert game.mode == 17
+    assert game.opponent_civs != ()
+    assert game.kind == "rm_1v1"
+
+
+def test_longest_win_streak():
+    streaks = WinStreaks()
+    results = [True, True, False, True, True, True, False, True]
+    # Newest first, like stored history and synced pages
+    for game_id in reversed(range(len(results))):
+        streaks.add(record(game_id, results[game_id]))
+    streaks.add(record(100, True, mode=18))
+    assert streaks.longest(17) == 3
+    assert streaks.longest(18) == 1
+    assert streaks.longest(19) == 0
+
+    # An older win added later extends the streak before the loss
+    streaks.add(record(6, True)._replace(started=1_650_000_000 + 6 * 600 - 1,
+                                         game_id=50))
+    assert streaks.longest(17) == 4
+
+    streaks.clear()
+    assert streaks.longest(17) == 0
+
+
+def test_cube_filters():
+    cube = StatsCube()
+    cube.add(record(0, True))
+    cube.add(record(1, False, map_name="Altai"))
+    cube.add(record(2, True, mode=18))
+    assert cube.total() == (2, 1)
+    assert cube.total(17) == (1, 1)
+    assert cube.map_stats(17) == {"Dry Arabia": (1, 0), "Altai": (0, 1)}
+    cube.remove(record(2, True, mode=18))
+    assert cube.total() == (1, 1)
+
+
+def test_ratings_by_kind():
+    stats = PlayerStats()
+    stats.add(record(0, True)._replace(rating=1100, kind="rm_1v1"))
+    stats.add(record(1, True)._replace(rating=1500, kind="qm_1v1"))
+    stats.add(record(2, False)._replace(rating=1080, kind="rm_1v1"))
+    assert stats.current_rating[ranked_kind(17)][1] == 1080
+    assert stats.max_rating[ranked_kind(17)] == 1100
+    assert stats.current_rating["qm_1v1"][1] == 1500
+
+
+def test_window_evicts_oldest_games():
+    window = RollingWindow("Last 3 games", games=3)
+    assert window.record() == ""
+    for game_id, win in enumerate((True, False, True, True)):
+        window.add(record(game_id, win))
+    assert [r.game_id for r in window.records] == [1, 2, 3]
+    assert window.record() == "Last 3: 2-1"
+
+    # Loading history newest first doesn't add games older than the window
+    window.add(record(-1, False))
+    assert window.record() == "Last 3: 2-1"
+    window.add(record(4, False))
+    assert [r.game_id for r in window.records] == [2, 3, 4]
+    assert window.record() == "Last 3: 2-1"
+
+
+def test_window_evicts_old_days():
+    now = [1_650_000_000 + 10 * 600]
+    window = RollingWindow("Last 1 days", days=1, clock=lambda: now[0])
+    for game_id in range(10):
+        window.add(record(game_id, game_id % 2 == 0))
+    window.add(record(-200, True))  # Older than a day
+    assert window.record() == "Last 10: 5-5"
+
+    now[0] += 86400 - 600 * 6  # Games 0 to 3 are older than a day now
+    window.evict()
+    assert window.record() == "Last 6: 3-3"
+    assert window.game_ids == set(range(4, 10))
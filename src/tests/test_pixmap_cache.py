@@ -0,0 +1,48 @@
+"""
+Pixmaps cached for one size and transformation mode aren't reused for others
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from overlay.pixmap_cache import PixmapCache, PixmapKey, scale_image
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def image_path(app, tmp_path) -> str:
+    """ Gradient image, so scaling modes give different pixels"""
+    image = QtGui.QImage(120, 80, QtGui.QImage.Format_ARGB32)
+    for x in range(image.width()):
+        for y in range(image.height()):
+            image.setPixel(x, y, QtGui.qRgb(x * 2, y * 3, (x * y) % 256))
+    path = str(tmp_path / "flag.png")
+    assert image.save(path)
+    return path
+
+
+def test_scaled_from_original(image_path):
+    cache = PixmapCache()
+    fast = cache.pixmap(image_path, 60, 40, QtCore.Qt.KeepAspectRatio,
+                        QtCore.Qt.FastTransformation)
+    key = PixmapKey(image_path, 30, 20, QtCore.Qt.KeepAspectRatio,
+                    QtCore.Qt.SmoothTransformation)
+    smooth = cache.pixmap(*key)
+    expected = scale_image(QtGui.QImage(image_path), key)
+    assert smooth.toImage() == expected.convertToFormat(
+        smooth.toImage().format())
+    assert cache.pixmap(*key) is smooth
+    assert len(cache.pixmaps) == 2
+    assert cache.size == sum(
+        p.width() * p.height() * p.depth() // 8 for p in (fast, smooth))
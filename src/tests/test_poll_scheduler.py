@@ -0,0 +1,185 @@
+"""
+Replays a day of play against `PollScheduler` with a simulated clock
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from overlay.api_checking import PollScheduler
+from overlay.settings import settings
+
+DAY = datetime(2026, 10, 18, tzinfo=timezone.utc).timestamp()
+HOUR = 60 * 60
+MINUTE = 60
+# Games played during the day (start, end)
+GAMES = ((DAY - HOUR, DAY - HOUR + 30 * MINUTE),
+         (DAY + 9 * HOUR, DAY + 9 * HOUR + 25 * MINUTE),
+         (DAY + 9 * HOUR + 30 * MINUTE, DAY + 9 * HOUR + 50 * MINUTE),
+         (DAY + 20 * HOUR, DAY + 20 * HOUR + 40 * MINUTE))
+ERRORS = (DAY + 12 * HOUR, DAY + 12 * HOUR + 20 * MINUTE)
+RATE_LIMITED = (DAY + 15 * HOUR, DAY + 15 * HOUR + 5 * MINUTE)
+RETRY_AFTER = 600
+
+
+class Clock:
+    """ Simulated time, advanced by the replay"""
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def last_game(now: float) -> Dict[str, Any]:
+    """ Data of the last game as returned by aoe4world at `now`"""
+    for game_id, (start, end) in reversed(tuple(enumerate(GAMES))):
+        if now >= start:
+            ongoing = now < end
+            return {
+                'game_id': game_id,
+                'started_at': datetime.fromtimestamp(
+                    start, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                'duration': None if ongoing else end - start,
+                'ongoing': ongoing
+            }
+    raise ValueError("No game")
+
+
+def within(now: float, window: Tuple[float, float]) -> bool:
+    return window[0] <= now < window[1]
+
+
+def replay(scheduler: PollScheduler, clock: Clock,
+           end: float) -> List[Tuple[float, str, int]]:
+    """ Polls until `end` the way `Api_checker.get_data` does.
+    Returns (time, mode, delay) for each poll."""
+    polls = []
+    previous: Optional[Dict[str, Any]] = None
+    while clock.now < end:
+        if within(clock.now, ERRORS):
+            scheduler.failed()
+        elif within(clock.now, RATE_LIMITED):
+            scheduler.rate_limited(RETRY_AFTER)
+        else:
+            data = last_game(clock.now)
+            if data == previous:
+                scheduler.unchanged()
+            else:
+                scheduler.update(data)
+                previous = data
+        delay = scheduler.next_delay()
+        polls.append((clock.now, scheduler.mode, delay))
+        clock.now += delay
+    return polls
+
+
+def backoff(limit: int, count: int) -> List[int]:
+    """ Expected delays after switching to a mode that backs off up to `limit`"""
+    delays = []
+    delay = settings.interval
+    for _ in range(count):
+        delays.append(delay)
+        delay = min(delay * 2, limit)
+    return delays
+
+
+def runs(polls: List[Tuple[float, str, int]]):
+    """ Splits polls into runs with the same mode"""
+    current: List[Tuple[float, str, int]] = []
+    for poll in polls:
+        if current and current[-1][1] != poll[1]:
+            yield current
+            current = []
+        current.append(poll)
+    if current:
+        yield current
+
+
+@pytest.fixture(autouse=True)
+def interval(monkeypatch):
+    monkeypatch.setattr(settings, "interval", 15)
+
+
+@pytest.fixture
+def day() -> List[Tuple[float, str, int]]:
+    clock = Clock(DAY)
+    return replay(PollScheduler(clock=clock), clock, DAY + 24 * HOUR)
+
+
+def test_delay_sequences(day):
+    expected = {
+        "queue": lambda count: [settings.interval] * count,
+        "ongoing": lambda count: backoff(PollScheduler.MAX_ONGOING_INTERVAL,
+                                         count),
+        "idle": lambda count: backoff(PollScheduler.MAX_IDLE_INTERVAL, count),
+        "error": lambda count: backoff(PollScheduler.MAX_ERROR_INTERVAL, count)
+    }
+    modes = set()
+    for run in runs(day):
+        mode = run[0][1]
+        modes.add(mode)
+        delays = [delay for _, _, delay in run]
+        if within(run[0][0], RATE_LIMITED):
+            assert delays == [RETRY_AFTER]
+        else:
+            assert delays == expected[mode](len(run)), mode
+    assert modes == {"queue", "ongoing", "idle", "error"}
+
+
+def test_queue_window(day):
+    # Polls every interval for the queue window after a game ends
+    for _, end in (GAMES[2], GAMES[3]):
+        finished = min(t for t, mode, _ in day if mode == "queue" and t >= end)
+        idle = min(t for t, mode, _ in day if mode == "idle" and t > finished)
+        assert 0 <= idle - finished - PollScheduler.QUEUE_WINDOW < settings.interval
+
+
+def test_game_detection(day):
+    for start, end in GAMES[1:]:
+        started = min(t for t, mode, _ in day if mode == "ongoing" and t >= start)
+        finished = min(t for t, mode, _ in day if mode == "queue" and t >= end)
+        assert started - start <= PollScheduler.MAX_IDLE_INTERVAL
+        assert finished - end <= PollScheduler.MAX_ONGOING_INTERVAL
+
+
+def test_retry_after(day):
+    limited = [(t, delay) for t, _, delay in day if within(t, RATE_LIMITED)]
+    assert [delay for _, delay in limited] == [RETRY_AFTER]
+    # The next poll waits for the server
+    next_poll = min(t for t, _, _ in day if t > limited[0][0])
+    assert next_poll - limited[0][0] == RETRY_AFTER
+
+
+def test_poll_count(day):
+    # Polling every interval would be 5760 requests a day
+    assert len(day) < 24 * HOUR / settings.interval / 5
+
+
+def test_reset_clears_retry_after():
+    clock = Clock(DAY)
+    scheduler = PollScheduler(clock=clock)
+    scheduler.rate_limited(RETRY_AFTER)
+    assert scheduler.next_delay() == RETRY_AFTER
+    scheduler.reset()
+    assert scheduler.next_delay() == settings.interval
+
+
+def test_peek_keeps_backoff():
+    clock = Clock(DAY)
+    scheduler = PollScheduler(clock=clock)
+    scheduler.update(last_game(DAY - HOUR + MINUTE))  # Ongoing
+    delays = [scheduler.next_delay() for _ in range(3)]
+    assert delays == [settings.interval * 2**i for i in range(3)]
+    assert scheduler.peek_delay() == delays[-1]
+    assert scheduler.peek_delay() == delays[-1]
+    assert scheduler.next_delay() == min(
+        delays[-1] * 2, max(PollScheduler.MAX_ONGOING_INTERVAL,
+                            settings.interval))
+
+    scheduler.failed()  # Mode changes, so does the backoff
+    assert scheduler.peek_delay() == settings.interval
+    assert scheduler.mode == "ongoing"
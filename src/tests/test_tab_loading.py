@@ -0,0 +1,126 @@
+"""
+Tabs building their data from stored games in workers drop results
+of loads started for a previous profile
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import os
+from typing import Any, Callable, List, Tuple
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+
+import overlay.tab_graphs as tab_graphs
+import overlay.tab_matchups as tab_matchups
+import overlay.tab_stats as tab_stats
+from overlay.match_stats import (GameRecord, MatchupMatrix, PlayerStats,
+                                 RatingHistory, RatingPoint)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def scheduled(monkeypatch) -> List[Tuple[Callable, Tuple[Any, ...]]]:
+    """ Loads started by tabs instead of running them in workers"""
+    calls = []
+
+    def scheldule(result_callback, fn, *args, **kwargs):
+        calls.append((result_callback, args))
+
+    for module in (tab_stats, tab_matchups, tab_graphs):
+        monkeypatch.setattr(module, "scheldule", scheldule)
+    return calls
+
+
+def record(game_id: int,
+           win: bool = True,
+           mode: int = 17,
+           opponent_civs: Tuple[int, ...] = (1, )) -> GameRecord:
+    return GameRecord(game_id, 1_650_000_000 + game_id * 600, 0, "Dry Arabia",
+                      mode, win, 1000, opponent_civs)
+
+
+def test_stats_drop_previous_profile(app, scheduled):
+    tab = tab_stats.StatsTab(None)
+    tab.clear_match_data()
+    tab.load(1)
+    tab.clear_match_data()
+    tab.load(2)
+    (old_loaded, _), (new_loaded, _) = scheduled
+
+    old_stats = PlayerStats()
+    old_stats.add(record(0))
+    old_loaded(old_stats)
+    assert tab.pending == []
+    assert not tab.stats.game_ids
+
+    new_stats = PlayerStats()
+    new_stats.add(record(1, win=False))
+    new_loaded(new_stats)
+    assert tab.stats is new_stats
+    assert tab.stats.cube.total() == (0, 1)
+
+
+def test_matchups_drop_previous_profile(app, scheduled):
+    tab = tab_matchups.MatchupTab(None)
+    tab.load(1)
+    tab.clear_match_data()
+    tab.load(2)
+    (old_loaded, _), (new_loaded, _) = scheduled
+
+    old_matchups = MatchupMatrix()
+    old_matchups.add(record(0))
+    old_loaded(old_matchups)
+    assert tab.pending == []
+    assert not tab.matchups.game_ids
+
+    new_matchups = MatchupMatrix()
+    new_loaded(new_matchups)
+    assert tab.matchups is new_matchups
+
+
+def test_matchups_filtered(app, scheduled):
+    tab = tab_matchups.MatchupTab(None)
+    tab.matchups.add(record(0))
+    tab.matchups.add(record(1, win=False, mode=18, opponent_civs=(1, 2)))
+    tab.matchups.add(record(2, opponent_civs=()))
+    tab.update_heatmap()
+    assert tab.games_found.text() == "Games analyzed: 2"
+    tab.mode_box.setCurrentIndex(2)  # 2v2
+    assert tab.games_found.text() == "Games analyzed: 1"
+
+    model = tab.model
+    tooltip = lambda column: model.data(model.index(0, column),
+                                        QtCore.Qt.ToolTipRole)
+    assert "once for each opponent" in tooltip(1)
+    tab.mode_box.setCurrentIndex(0)
+    assert "once for each opponent" in tooltip(1)  # 1v1 and 2v2 games
+    assert "once for each opponent" in tooltip(2)
+    tab.mode_box.setCurrentIndex(1)  # 1v1
+    assert "95% confidence" in tooltip(1)
+
+
+def test_graph_drop_previous_profile(app, scheduled):
+    tab = tab_graphs.GraphTab(None)
+    tab.load(1)
+    tab.clear_match_data()
+    tab.load(2)
+    (old_loaded, _), (new_loaded, _) = scheduled
+
+    old_history = RatingHistory()
+    old_history.add(RatingPoint(0, 1_650_000_000, "rm_1v1", 1000))
+    old_loaded(old_history)
+    assert tab.pending == []
+    assert not tab.indexes
+
+    new_history = RatingHistory()
+    new_history.add(RatingPoint(1, 1_650_000_000, "qm_1v1", 900))
+    new_loaded(new_history)
+    assert list(tab.indexes) == ["qm_1v1"]
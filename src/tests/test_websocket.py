@@ -0,0 +1,119 @@
+"""
+Queuing versioned player data from several threads, failing to bind
+the port and invalid messages from clients
+
+Run from the `src` folder: python -m pytest tests
+"""
+
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, List
+
+import websockets
+
+from overlay.websocket import Websocket_manager
+
+
+class Loop:
+    """ Records callbacks instead of running them in an event loop"""
+
+    def __init__(self):
+        self.callbacks: List[tuple] = []
+
+    def call_soon_threadsafe(self, callback: Callable, *args: Any):
+        time.sleep(0.0001)  # Widens the window for reordering
+        self.callbacks.append(args)
+
+
+def test_player_data_queued_in_version_order():
+    manager = Websocket_manager(0)
+    manager.loop = Loop()
+
+    def sender(thread: int):
+        for i in range(50):
+            manager.send({
+                "type": "player_data",
+                "data": {
+                    "map": f"{thread} {i}"
+                }
+            })
+
+    threads = [threading.Thread(target=sender, args=(i, )) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    versions = [
+        json.loads(encoded)["version"]
+        for _, encoded, _ in manager.loop.callbacks
+    ]
+    assert versions == list(range(1, 201))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def test_port_in_use():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        sock.listen()
+        manager = Websocket_manager(sock.getsockname()[1])
+        manager.run()
+        manager.thread_server.join(timeout=5)
+    assert not manager.thread_server.is_alive()
+    assert manager.loop is None
+    manager.send({"type": "color", "data": ["red"]})
+    assert "color" in manager.state
+
+
+def test_invalid_messages_keep_client():
+    manager = Websocket_manager(free_port())
+    manager.send({"type": "color", "data": ["red"]})
+    manager.run()
+
+    async def client() -> List[str]:
+        for _ in range(50):
+            if manager.loop is not None:
+                break
+            await asyncio.sleep(0.02)
+        async with websockets.connect(
+                f"ws://localhost:{manager.port}") as websocket:
+            received = [await websocket.recv()]
+            for text in ("[1]", '"resync"', "null"):
+                await websocket.send(text)
+            await websocket.send(json.dumps({"type": "resync"}))
+            received.append(await asyncio.wait_for(websocket.recv(), 2))
+            return received
+
+    received = asyncio.run(client())
+    assert received == [manager.state["color"]] * 2
+    manager.loop.call_soon_threadsafe(manager.loop.stop)
+
+
+def test_client_stats_logged(caplog):
+    manager = Websocket_manager(free_port(), stats_interval=0.05)
+    manager.run()
+
+    async def client():
+        for _ in range(50):
+            if manager.loop is not None:
+                break
+            await asyncio.sleep(0.02)
+        async with websockets.connect(f"ws://localhost:{manager.port}"):
+            await asyncio.sleep(0.3)
+
+    with caplog.at_level(logging.INFO, logger="overlay.websocket"):
+        asyncio.run(client())
+    manager.loop.call_soon_threadsafe(manager.loop.stop)
+    logged = [r.message for r in caplog.records if "clients:" in r.message]
+    # Logged when the client connects, not again while nothing changes
+    assert len(logged) == 1
+    assert "'dropped': 0" in logged[0]